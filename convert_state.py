@@ -0,0 +1,89 @@
+import time
+import sqlite_store  # Per-file states are kept in SQLite so they survive crashes
+
+# Configurable settings
+CONVERT_STATE_FILE = "convert_state.db"
+STATES = ("pending", "remuxed", "verified", "tagged", "failed")
+UNFINISHED_STATES = ("pending", "remuxed", "verified")
+
+# path is the file found in the source folder; output is the MP4 that is remuxed, verified and tagged
+# (the same file for MP4s that only need tagging)
+_db = sqlite_store.Database(CONVERT_STATE_FILE, [
+    "CREATE TABLE IF NOT EXISTS files ("
+    "path TEXT PRIMARY KEY, folder TEXT, output TEXT, state TEXT, failed_stage TEXT, error TEXT, updated_at REAL)",
+    "CREATE INDEX IF NOT EXISTS files_folder_state ON files (folder, state)",
+    "CREATE INDEX IF NOT EXISTS files_output ON files (output)"
+])
+
+def close():
+    """Close the state database."""
+    _db.close()
+
+def get_state(path):
+    """Return the state of a tracked file, or None if it isn't tracked."""
+    with _db.lock:
+        row = _db.connect().execute("SELECT state FROM files WHERE path = ?", (path,)).fetchone()
+    return row[0] if row else None
+
+def is_claimed(output):
+    """True if output is the MP4 an unfinished file is being remuxed to."""
+    placeholders = ", ".join("?" * len(UNFINISHED_STATES))
+    with _db.lock:
+        row = _db.connect().execute(
+            f"SELECT 1 FROM files WHERE output = ? AND path != output AND state IN ({placeholders})",
+            (output, *UNFINISHED_STATES)
+        ).fetchone()
+    return row is not None
+
+def track(folder, path, output):
+    """Start tracking a file found in the source folder, or restart one that finished earlier and is back.
+
+    Files that are still unfinished keep their state, so an interrupted run resumes where it stopped.
+    Returns the state the file is in afterwards."""
+    with _db.lock:
+        connection = _db.connect()
+        row = connection.execute("SELECT state FROM files WHERE path = ?", (path,)).fetchone()
+        if row and row[0] in UNFINISHED_STATES:
+            return row[0]
+        connection.execute(
+            "INSERT OR REPLACE INTO files (path, folder, output, state, failed_stage, error, updated_at) "
+            "VALUES (?, ?, ?, 'pending', NULL, NULL, ?)",
+            (path, folder, output, time.time())
+        )
+        connection.commit()
+    return "pending"
+
+def set_state(path, state, failed_stage=None, error=None):
+    """Record that a file moved to a new state. Committed straight away so a crash loses at most this step."""
+    with _db.lock:
+        connection = _db.connect()
+        connection.execute(
+            "UPDATE files SET state = ?, failed_stage = ?, error = ?, updated_at = ? WHERE path = ?",
+            (state, failed_stage, error, time.time(), path)
+        )
+        connection.commit()
+
+def forget(path):
+    """Stop tracking a file that disappeared before it was finished."""
+    with _db.lock:
+        connection = _db.connect()
+        connection.execute("DELETE FROM files WHERE path = ?", (path,))
+        connection.commit()
+
+def get_unfinished(folder):
+    """Return (path, output, state) for every file in folder that hasn't been tagged or failed yet."""
+    placeholders = ", ".join("?" * len(UNFINISHED_STATES))
+    with _db.lock:
+        return _db.connect().execute(
+            f"SELECT path, output, state FROM files WHERE folder = ? AND state IN ({placeholders}) ORDER BY path",
+            (folder, *UNFINISHED_STATES)
+        ).fetchall()
+
+def get_failures(folder, since):
+    """Return (path, output, failed_stage) for files in folder that failed at or after the since timestamp."""
+    with _db.lock:
+        return _db.connect().execute(
+            "SELECT path, output, failed_stage FROM files WHERE folder = ? AND state = 'failed' AND updated_at >= ? "
+            "ORDER BY path",
+            (folder, since)
+        ).fetchall()
@@ -1,24 +1,29 @@
 import os
+import time
+import queue
+import argparse
+import threading
 import subprocess
 import shutil
 from tqdm import tqdm
 import send2trash  # Add send2trash for sending files to recycle bin
+import probe_cache  # Shared on-disk ffprobe result cache
+import mp4_tags  # Native Tool tag writer, edits moov in place instead of copying the file
+import convert_state  # Per-file progress through the pipeline, so an interrupted run can resume
 
 # Configurable settings
 TOOL_TEXT = "HandBrake 1.9.2 2025022300"  # Text to be written to the Tool tag
-MP4TAG_PATH = r"C:\\Tools\\mp4tag\\mp4tag.exe"  # Path to the mp4tag executable
 SUPPORTED_EXTENSIONS = ('.mkv', '.webm', '.avi', '.mpg', '.m4v')
 FAILED_FOLDER_NAME = "failedconv"
 TAGGED_FOLDER_NAME = "tagged"
+REMUX_WORKERS = 3  # Stream-copy remuxes are I/O bound, so several can share a drive
+VERIFY_WORKERS = 2
+TAG_WORKERS = 2
 
 def verify_file_with_ffprobe(file_path):
-    """Verify the output file using ffprobe."""
-    ffprobe_command = [
-        "ffprobe", "-v", "error", "-select_streams", "v:0", "-show_entries", "stream=codec_name",
-        "-of", "default=noprint_wrappers=1:nokey=1", file_path
-    ]
-    ffprobe_result = subprocess.run(ffprobe_command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-    return ffprobe_result.returncode == 0 and ffprobe_result.stdout.strip() != b''
+    """Verify the output file using the cached ffprobe result."""
+    video_streams = probe_cache.get_streams(probe_cache.probe_file(file_path), "video")
+    return bool(video_streams and video_streams[0].get("codec_name"))
 
 def remove_0kb_files(folder):
     """Remove all 0KB files in the specified folder."""
@@ -29,112 +34,234 @@ def remove_0kb_files(folder):
                 print(f"\nDeleting 0KB file: {file_path}")
                 send2trash.send2trash(file_path)
 
-def convert_and_tag_mp4(source_folder, destination_folder):
+def scan_source(source_folder):
+    """Walk the source once and record every video in the state table. Returns the unsupported files.
+
+    Files already being worked on keep their state; the MP4 an unfinished file is being remuxed to
+    belongs to that file and is not tracked on its own."""
+    unsupported_files = []
+    for root, dirs, files in os.walk(source_folder):
+        if FAILED_FOLDER_NAME in dirs:
+            dirs.remove(FAILED_FOLDER_NAME)  # Files that already failed are left for review
+        for file in files:
+            file_path = os.path.join(root, file)
+            if file.lower().endswith(SUPPORTED_EXTENSIONS):
+                output_file_path = os.path.join(source_folder, os.path.splitext(file)[0] + ".mp4")
+                if convert_state.get_state(file_path) not in convert_state.UNFINISHED_STATES and (
+                        os.path.exists(output_file_path) or convert_state.is_claimed(output_file_path)):
+                    print(f"\nSkipping existing file: {output_file_path}")
+                    continue
+                convert_state.track(source_folder, file_path, output_file_path)
+            elif file.lower().endswith('.mp4'):
+                if not convert_state.is_claimed(file_path):
+                    convert_state.track(source_folder, file_path, file_path)
+            else:
+                unsupported_files.append(file_path)
+    return unsupported_files
+
+def queue_unfinished(source_folder, destination_folder):
+    """Turn every unfinished file in the state table into an item for the stage it stopped before.
+
+    Returns {"Remux": [...], "Verify": [...], "Tag": [...]}. Items are {"path", "source", "file", "size"}:
+    path is the state table key, file the MP4 being worked on and source the original (None for MP4s
+    that only need tagging). Files that disappeared since they were recorded are dropped."""
+    items = {"Remux": [], "Verify": [], "Tag": []}
+    for path, output, state in convert_state.get_unfinished(source_folder):
+        source = path if path != output else None
+        if state == "remuxed" and not os.path.exists(output):
+            state = "pending"  # The remux was lost; start again from the original if it is still there
+            convert_state.set_state(path, state)
+        if state == "pending" and source:
+            if not os.path.exists(source):
+                convert_state.forget(path)
+                continue
+            items["Remux"].append({"path": path, "source": source, "file": output, "size": os.path.getsize(source)})
+        elif not os.path.exists(output):
+            if os.path.exists(os.path.join(destination_folder, os.path.basename(output))):
+                convert_state.set_state(path, "tagged")  # Interrupted after the move, before it was recorded
+            elif state == "verified":
+                convert_state.set_state(path, "failed", "tag", "remuxed file is missing")
+            else:
+                convert_state.forget(path)
+        else:
+            stage = "Verify" if state == "remuxed" else "Tag"
+            items[stage].append({"path": path, "source": source, "file": output, "size": os.path.getsize(output)})
+    return items
+
+def run_pipeline(stages, initial_items):
+    """Run items through a chain of stages, each with its own pool of worker threads.
+
+    stages is a list of (name, function, workers). function(item) returns the item to hand to the next
+    stage, or None if the item stops there. initial_items maps a stage name to the items that start at
+    that stage. Returns per-stage stats: {"files", "bytes", "busy", "start", "end"}.
+    """
+    queues = [queue.Queue() for _ in stages]
+    stats = [{"files": 0, "bytes": 0, "busy": 0.0, "start": None, "end": None} for _ in stages]
+    stats_lock = threading.Lock()
+    bars = []
+    for index, (name, _, _) in enumerate(stages):
+        # Each bar counts everything that could still reach its stage; items dropped earlier are taken off
+        reachable = sum(len(initial_items.get(earlier, [])) for earlier, _, _ in stages[:index + 1])
+        bars.append(tqdm(total=reachable, desc=f"{name:<8}", unit="file", position=index, leave=True))
+    for index, (name, _, _) in enumerate(stages):
+        for item in initial_items.get(name, []):
+            queues[index].put(item)
+
+    def worker(index):
+        _, function, _ = stages[index]
+        while True:
+            item = queues[index].get()
+            if item is None:
+                return
+            started = time.monotonic()
+            try:
+                result = function(item)
+            except Exception as e:
+                tqdm.write(f"\nUnexpected error in {stages[index][0]} for {item['file']}: {e}")
+                result = None
+            finished = time.monotonic()
+            with stats_lock:
+                stage_stats = stats[index]
+                stage_stats["files"] += 1
+                stage_stats["bytes"] += item["size"]
+                stage_stats["busy"] += finished - started
+                stage_stats["start"] = min(stage_stats["start"] or started, started)
+                stage_stats["end"] = max(stage_stats["end"] or finished, finished)
+                bars[index].update(1)
+                if result is None:
+                    for later in bars[index + 1:]:
+                        later.total -= 1
+                        later.refresh()
+            if result is not None and index + 1 < len(stages):
+                queues[index + 1].put(result)
+
+    stage_threads = []
+    for index, (_, _, workers) in enumerate(stages):
+        threads = [threading.Thread(target=worker, args=(index,), daemon=True) for _ in range(max(1, workers))]
+        for thread in threads:
+            thread.start()
+        stage_threads.append(threads)
+
+    # Close each stage once everything before it has drained
+    for index, threads in enumerate(stage_threads):
+        for _ in threads:
+            queues[index].put(None)
+        for thread in threads:
+            while thread.is_alive():
+                thread.join(timeout=0.5)  # Timeout keeps Ctrl+C responsive on Windows
+    for bar in bars:
+        bar.close()
+    return stats
+
+def print_stage_stats(stages, stats):
+    """Print files, data and throughput for each pipeline stage."""
+    print(f"\n{'stage':<8} {'files':>6} {'GB':>8} {'seconds':>9} {'MB/s':>8} {'files/min':>10} {'workers':>8}")
+    for (name, _, workers), stage_stats in zip(stages, stats):
+        elapsed = (stage_stats["end"] - stage_stats["start"]) if stage_stats["files"] else 0
+        rate = stage_stats["bytes"] / 1024 ** 2 / elapsed if elapsed else 0
+        files_per_minute = stage_stats["files"] * 60 / elapsed if elapsed else 0
+        print(f"{name:<8} {stage_stats['files']:>6} {stage_stats['bytes'] / 1024 ** 3:>8.2f} {elapsed:>9.1f} "
+              f"{rate:>8.1f} {files_per_minute:>10.1f} {workers:>8}")
+
+def convert_and_tag_mp4(source_folder, destination_folder, remux_workers=REMUX_WORKERS,
+                        verify_workers=VERIFY_WORKERS, tag_workers=TAG_WORKERS):
     # Ensure the source folder exists
     if not os.path.exists(source_folder):
         print(f"\nSource folder does not exist: {source_folder}")
         return
+    source_folder = os.path.abspath(source_folder)  # State is keyed by path, so the same folder must give the same keys
 
     # Ensure the destination folder exists or create it
     if not os.path.exists(destination_folder):
         os.makedirs(destination_folder)
         print(f"\nDestination folder created: {destination_folder}")
 
-    # Remove 0KB files from the source folder
+    # Remove 0KB files from both folders before anything is queued
     remove_0kb_files(source_folder)
-
-    # Initialize lists to track unprocessed files
-    unsupported_files = []
-    failed_tagging_files = []
-    failed_conversions = []
+    remove_0kb_files(destination_folder)
 
     # Create a folder for failed conversions
     failed_folder = os.path.join(source_folder, FAILED_FOLDER_NAME)
     os.makedirs(failed_folder, exist_ok=True)
+    run_started = time.time()
 
-    while True:
-        # Get a list of all files in the source folder
-        all_files = []
-        for root, dirs, files in os.walk(source_folder):
-            for file in files:
-                all_files.append(os.path.join(root, file))
-
-        source_files = [file for file in all_files if file.lower().endswith(SUPPORTED_EXTENSIONS)]
-        unsupported_files.extend([file for file in all_files if not file.lower().endswith(SUPPORTED_EXTENSIONS + ('.mp4',))])
+    def fail_conversion(item, stage, error):
+        shutil.move(item["source"], os.path.join(failed_folder, os.path.basename(item["source"])))
+        convert_state.set_state(item["path"], "failed", stage, error)
 
-        conversion_made = False
-        for file in tqdm(source_files, desc="Converting Files", unit="file"):
-            output_file_path = os.path.join(source_folder, os.path.basename(file).replace(os.path.splitext(file)[1], ".mp4"))
-
-            if os.path.exists(output_file_path):
-                print(f"\nSkipping existing file: {output_file_path}")
-                continue
-
-            ffmpeg_command = [
-                "ffmpeg", "-fflags", "+genpts", "-i", file, "-strict", "experimental", "-c:v", "copy", "-c:a", "copy", "-map", "0:v", "-map", "0:a", output_file_path
-            ]
-
-            try:
-                result = subprocess.run(ffmpeg_command, check=True, stderr=subprocess.PIPE)
-                result.check_returncode()
-
-                # Verify the output file using ffprobe
-                if not verify_file_with_ffprobe(output_file_path):
-                    print(f"\nError: Verification failed for '{output_file_path}'. Moving original file to 'failedconv'.")
-                    failed_conversions.append(file)
-                    send2trash.send2trash(output_file_path)  # Send failed conversion to recycle bin
-                    shutil.move(file, os.path.join(failed_folder, os.path.basename(file)))  # Move source file
-                    continue
+    def remux(item):
+        if os.path.exists(item["file"]):
+            send2trash.send2trash(item["file"])  # Left over from a remux that was interrupted
+        ffmpeg_command = [
+            "ffmpeg", "-fflags", "+genpts", "-i", item["source"], "-strict", "experimental", "-c:v", "copy", "-c:a", "copy", "-map", "0:v", "-map", "0:a", item["file"]
+        ]
+        try:
+            subprocess.run(ffmpeg_command, check=True, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+            convert_state.set_state(item["path"], "remuxed")
+            item["size"] = os.path.getsize(item["file"])  # Later stages work on the remuxed file
+            return item
+        except subprocess.CalledProcessError as e:
+            error_message = e.stderr.decode(errors="replace")
+            tqdm.write(f"\nFailed to convert file: {item['source']}. Error: {error_message}. Moving to 'failedconv'.")
+        except Exception as e:
+            error_message = str(e)
+            tqdm.write(f"\nUnexpected error during conversion: {e}. Moving to 'failedconv'.")
+        if os.path.exists(item["file"]):
+            send2trash.send2trash(item["file"])  # Don't leave a partial remux behind to be tagged later
+        fail_conversion(item, "remux", error_message)
+        return None
 
-                # If ffprobe is successful, send the original file to recycle bin
-                send2trash.send2trash(file)
-                print(f"\nConverted and sent original file to recycle bin: {file}")
-                conversion_made = True
-            except subprocess.CalledProcessError as e:
-                error_message = e.stderr.decode()
-                print(f"\nFailed to convert file: {file}. Error: {error_message}. Moving to 'failedconv'.")
-                failed_conversions.append(file)
-                shutil.move(file, os.path.join(failed_folder, os.path.basename(file)))
-            except Exception as e:
-                print(f"\nUnexpected error during conversion: {e}. Moving to 'failedconv'.")
-                failed_conversions.append(file)
-                shutil.move(file, os.path.join(failed_folder, os.path.basename(file)))
-
-        # Restart the loop if any files were converted
-        if conversion_made:
-            print("\nRescanning the folder for newly converted files...")
-            continue
-        else:
-            break
+    def verify(item):
+        if not verify_file_with_ffprobe(item["file"]):
+            tqdm.write(f"\nError: Verification failed for '{item['file']}'. Moving original file to 'failedconv'.")
+            send2trash.send2trash(item["file"])  # Send failed conversion to recycle bin
+            fail_conversion(item, "verify", "ffprobe found no video stream")
+            return None
 
-    # Remove 0KB files from the destination folder
-    remove_0kb_files(destination_folder)
+        # If ffprobe is successful, send the original file to recycle bin. It is already gone if a
+        # previous run was interrupted between doing this and recording it
+        if os.path.exists(item["source"]):
+            send2trash.send2trash(item["source"])
+            tqdm.write(f"\nConverted and sent original file to recycle bin: {item['source']}")
+        convert_state.set_state(item["path"], "verified")
+        return item
 
-    # Tag all MP4 files (excluding failed conversions)
-    all_mp4_files = [file for file in all_files if file.lower().endswith('.mp4')]
-    for file in tqdm(all_mp4_files, desc="Tagging Files", unit="file"):
+    def tag(item):
+        file = item["file"]
         output_file = os.path.join(destination_folder, os.path.basename(file))
 
         # Check if the tagged file already exists
         if os.path.exists(output_file):
-            print(f"\nSkipping tagging, file already exists: {output_file}")
+            tqdm.write(f"\nSkipping tagging, file already exists: {output_file}")
             send2trash.send2trash(file)  # Send original file to recycle bin
-            continue
-
-        escaped_tool_text = f'{TOOL_TEXT}'
-        command = [MP4TAG_PATH, '--set', f'Tool:S:{escaped_tool_text}', file, output_file]
+            convert_state.set_state(item["path"], "tagged")
+            return item
 
-        print(f"\nTagging file: {file}")
         try:
-            subprocess.run(command, check=True)
-            print(f"\nSuccess: Tagged file saved to '{output_file}'.")
-            send2trash.send2trash(file)  # Send original file to recycle bin after successful tagging
-        except subprocess.CalledProcessError as e:
-            print(f"\nError: Failed to write the Tool tag for '{file}'. Error: {e}")
-            failed_tagging_files.append(file)
+            # Tag the file where it is, then move it; on the same drive the move is just a rename
+            mp4_tags.set_tag(file, TOOL_TEXT)
+            shutil.move(file, output_file)
+            convert_state.set_state(item["path"], "tagged")
+            tqdm.write(f"\nSuccess: Tagged file saved to '{output_file}'.")
+            return item
+        except (ValueError, OSError) as e:
+            tqdm.write(f"\nError: Failed to write the Tool tag for '{file}'. Error: {e}")
+            error_message = str(e)
         except Exception as e:
-            print(f"\nUnexpected error during tagging: {e}")
-            failed_tagging_files.append(file)
+            tqdm.write(f"\nUnexpected error during tagging: {e}")
+            error_message = str(e)
+        convert_state.set_state(item["path"], "failed", "tag", error_message)
+        return None
+
+    # Every file is tracked once, from pending through remuxed and verified to tagged (or failed).
+    # Files left unfinished by an interrupted run pick up at the stage they stopped before
+    unsupported_files = scan_source(source_folder)
+    initial_items = queue_unfinished(source_folder, destination_folder)
+    resumed = len(initial_items["Verify"]) + sum(1 for item in initial_items["Tag"] if item["source"])
+    if resumed:
+        print(f"\nResuming {resumed} files from an interrupted run")
+    stages = [("Remux", remux, remux_workers), ("Verify", verify, verify_workers), ("Tag", tag, tag_workers)]
+    stats = run_pipeline(stages, initial_items)
 
     # Print summary of unprocessed files
     if unsupported_files:
@@ -142,20 +269,30 @@ def convert_and_tag_mp4(source_folder, destination_folder):
         for file in unsupported_files:
             print(file)
 
+    failures = convert_state.get_failures(source_folder, run_started)
+    failed_conversions = [path for path, _, stage in failures if stage != "tag"]
     if failed_conversions:
         print("\nThe following files failed conversion and were moved to 'failedconv':")
         for file in failed_conversions:
             print(file)
 
+    failed_tagging_files = [output for _, output, stage in failures if stage == "tag"]
     if failed_tagging_files:
         print("\nThe following files failed tagging:")
         for file in failed_tagging_files:
             print(file)
 
+    print_stage_stats(stages, stats)
+    probe_cache.print_stats()
     print("\nScript completed successfully.")
 
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Remux videos to MP4, verify them and write the Tool tag.")
+    parser.add_argument("--remux-workers", type=int, default=REMUX_WORKERS, help="concurrent ffmpeg remuxes")
+    parser.add_argument("--verify-workers", type=int, default=VERIFY_WORKERS, help="concurrent ffprobe checks")
+    parser.add_argument("--tag-workers", type=int, default=TAG_WORKERS, help="concurrent tag writes")
+    args = parser.parse_args()
 
-# Example usage
-source_folder = input("Enter the source folder path: ")
-destination_folder = input("Enter the destination folder path: ")
-convert_and_tag_mp4(source_folder, destination_folder)
\ No newline at end of file
+    source_folder = input("Enter the source folder path: ")
+    destination_folder = input("Enter the destination folder path: ")
+    convert_and_tag_mp4(source_folder, destination_folder, args.remux_workers, args.verify_workers, args.tag_workers)
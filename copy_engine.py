@@ -0,0 +1,320 @@
+import os
+import sys
+import json
+import time
+import errno
+import hashlib
+import argparse
+import threading
+
+try:
+    import xxhash  # Optional: xxh3 hashes at memory speed, far faster than any disk
+except ImportError:
+    xxhash = None
+
+# Configurable settings
+COPY_BUFFER_SIZE = 16 * 1024 * 1024  # Buffer for the read/write fallback, reused between calls
+KERNEL_CHUNK_SIZE = 64 * 1024 * 1024  # Bytes per copy_file_range/sendfile call so progress keeps moving
+LEGACY_CHUNK_SIZE = 1024 * 1024  # The old 1MB read/write loop, kept for the benchmark
+NO_BUFFERING_THRESHOLD = 256 * 1024 * 1024  # Windows: skip the cache manager for files larger than this
+RESUME_CHECKPOINT_BYTES = 256 * 1024 * 1024  # How often a resumable copy records its verified offset
+RESUME_SUFFIX = ".partial.json"  # Sidecar next to a partial destination, e.g. movie.mkv.partial.json
+
+FICLONE = 0x40049409  # Linux ioctl that shares extents between files (btrfs, XFS, bcachefs)
+# errnos that mean "this kernel/filesystem can't do that", so the next method should be tried
+_UNSUPPORTED_ERRNOS = {errno.EXDEV, errno.ENOSYS, errno.EOPNOTSUPP, errno.EINVAL,
+                       getattr(errno, "ENOTSUP", errno.EOPNOTSUPP)}
+
+HASH_ALGORITHM = "xxh3_128" if xxhash else "blake2b-128"
+
+_buffers = threading.local()
+
+class VerificationError(IOError):
+    """The destination doesn't match what was read from the source."""
+
+def new_hasher():
+    """Return a streaming hasher for HASH_ALGORITHM."""
+    if xxhash:
+        return xxhash.xxh3_128()
+    return hashlib.blake2b(digest_size=16)
+
+def format_hash(hasher):
+    """Return a digest tagged with its algorithm, so hashes from another setup are never compared."""
+    return f"{HASH_ALGORITHM}:{hasher.hexdigest()}"
+
+def _get_buffer():
+    """Return this thread's reusable copy buffer."""
+    buffer = getattr(_buffers, "buffer", None)
+    if buffer is None:
+        buffer = _buffers.buffer = bytearray(COPY_BUFFER_SIZE)
+    return buffer
+
+def _report(progress, count, transferred=True):
+    if progress is not None and count:
+        if transferred:
+            progress(count)
+        else:
+            progress(count, transferred=False)
+
+def _try_reflink(fsrc, fdst, total_size, progress):
+    """Clone the source extents into the destination. Returns True if the filesystem supported it."""
+    if not sys.platform.startswith("linux"):
+        return False
+    try:
+        import fcntl
+        fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+    except (ImportError, OSError):
+        return False
+    _report(progress, total_size)
+    return True
+
+def _copy_file_range(fsrc, fdst, remaining, progress):
+    """Copy with os.copy_file_range from the current offsets. Returns the bytes left if the kernel refused."""
+    if not hasattr(os, "copy_file_range"):
+        return remaining
+    while remaining > 0:
+        try:
+            copied = os.copy_file_range(fsrc.fileno(), fdst.fileno(), min(remaining, KERNEL_CHUNK_SIZE))
+        except OSError as e:
+            if e.errno in _UNSUPPORTED_ERRNOS:
+                return remaining
+            raise
+        if copied == 0:
+            break  # Source shrank while copying
+        remaining -= copied
+        _report(progress, copied)
+    return 0
+
+def _sendfile(fsrc, fdst, remaining, progress):
+    """Copy with os.sendfile from the current offsets (file-to-file only works on Linux)."""
+    if not hasattr(os, "sendfile") or not sys.platform.startswith("linux"):
+        return remaining
+    while remaining > 0:
+        try:
+            copied = os.sendfile(fdst.fileno(), fsrc.fileno(), None, min(remaining, KERNEL_CHUNK_SIZE))
+        except OSError as e:
+            if e.errno in _UNSUPPORTED_ERRNOS:
+                return remaining
+            raise
+        if copied == 0:
+            break
+        remaining -= copied
+        _report(progress, copied)
+    return 0
+
+def _write_all(fdst, chunk):
+    """Unbuffered writes may be short, so keep writing until the whole chunk is out."""
+    while chunk:
+        chunk = chunk[fdst.write(chunk):]
+
+def _readinto_loop(fsrc, fdst, progress):
+    """Copy through a reused bytearray with readinto, so no new bytes objects are allocated per chunk."""
+    view = memoryview(_get_buffer())
+    while (count := fsrc.readinto(view)):
+        _write_all(fdst, view[:count])
+        _report(progress, count)
+
+def _copy_windows(src, dst, total_size, progress):
+    """Copy with CopyFileExW, which stays in the kernel and calls back with progress."""
+    import ctypes
+    from ctypes import wintypes
+
+    kernel32 = ctypes.WinDLL("kernel32", use_last_error=True)
+    progress_routine_type = ctypes.WINFUNCTYPE(
+        wintypes.DWORD, ctypes.c_longlong, ctypes.c_longlong, ctypes.c_longlong, ctypes.c_longlong,
+        wintypes.DWORD, wintypes.DWORD, wintypes.HANDLE, wintypes.HANDLE, wintypes.LPVOID
+    )
+    kernel32.CopyFileExW.argtypes = [wintypes.LPCWSTR, wintypes.LPCWSTR, progress_routine_type,
+                                     wintypes.LPVOID, ctypes.POINTER(wintypes.BOOL), wintypes.DWORD]
+    kernel32.CopyFileExW.restype = wintypes.BOOL
+
+    state = {"reported": 0, "error": None}
+
+    def on_progress(total, transferred, stream_size, stream_transferred, stream_number, reason, hsrc, hdst, data):
+        try:
+            _report(progress, transferred - state["reported"])
+            state["reported"] = transferred
+            return 0  # PROGRESS_CONTINUE
+        except BaseException as e:
+            # Exceptions can't cross the ctypes boundary, so cancel the copy and re-raise afterwards
+            state["error"] = e
+            return 1  # PROGRESS_CANCEL
+
+    flags = 0x1000 if total_size >= NO_BUFFERING_THRESHOLD else 0  # COPY_FILE_NO_BUFFERING
+    callback = progress_routine_type(on_progress)
+    if not kernel32.CopyFileExW(src, dst, callback, None, None, flags):
+        if state["error"] is not None:
+            raise state["error"]
+        raise ctypes.WinError(ctypes.get_last_error())
+    _report(progress, total_size - state["reported"])
+
+def copy_file(src, dst, progress=None):
+    """Copy src to dst using the fastest method the platform supports. Returns the name of the method used.
+
+    progress is called with the number of bytes copied since the last call (e.g. tqdm.update).
+    """
+    total_size = os.path.getsize(src)
+
+    if os.name == "nt":
+        _copy_windows(src, dst, total_size, progress)
+        return "CopyFileExW"
+
+    with open(src, "rb", buffering=0) as fsrc, open(dst, "wb", buffering=0) as fdst:
+        if _try_reflink(fsrc, fdst, total_size, progress):
+            return "reflink"
+        remaining = _copy_file_range(fsrc, fdst, total_size, progress)
+        if remaining == 0:
+            return "copy_file_range"
+        # Both fallbacks continue from the offsets the previous method left behind
+        method = "sendfile" if remaining == total_size else "copy_file_range"
+        remaining = _sendfile(fsrc, fdst, remaining, progress)
+        if remaining == 0:
+            return method
+        _readinto_loop(fsrc, fdst, progress)
+        return "readinto"
+
+def hash_file(path, progress=None, hasher=None, limit=None):
+    """Hash a whole file (or its first limit bytes) through the reusable buffer."""
+    hasher = hasher or new_hasher()
+    view = memoryview(_get_buffer())
+    remaining = limit
+    with open(path, "rb", buffering=0) as f:
+        while remaining is None or remaining > 0:
+            count = f.readinto(view if remaining is None else view[:min(remaining, len(view))])
+            if not count:
+                break
+            hasher.update(view[:count])
+            _report(progress, count)
+            if remaining is not None:
+                remaining -= count
+    return format_hash(hasher)
+
+def resume_sidecar_path(dst):
+    return dst + RESUME_SUFFIX
+
+def discard_resume_state(dst):
+    """Forget any resume point recorded for dst."""
+    try:
+        os.remove(resume_sidecar_path(dst))
+    except FileNotFoundError:
+        pass
+
+def _load_resume_point(src_stat, dst):
+    """Return (offset, hasher) to continue a previous copy into dst, or (0, new hasher) to start over."""
+    try:
+        with open(resume_sidecar_path(dst), "r", encoding="utf-8") as f:
+            state = json.load(f)
+        dst_size = os.path.getsize(dst)
+    except (OSError, ValueError):
+        return 0, new_hasher()
+
+    offset = state.get("offset", 0)
+    if (state.get("size") != src_stat.st_size or state.get("mtime_ns") != src_stat.st_mtime_ns
+            or not state.get("prefix_hash", "").startswith(HASH_ALGORITHM + ":") or dst_size < offset):
+        return 0, new_hasher()  # Source changed, or the state came from another hash setup
+
+    # Re-hash the kept prefix from the destination; it must match what was read from the source
+    hasher = new_hasher()
+    if hash_file(dst, hasher=hasher, limit=offset) != state["prefix_hash"]:
+        return 0, new_hasher()
+    return offset, hasher
+
+def _save_resume_point(src_stat, dst, offset, hasher):
+    sidecar = resume_sidecar_path(dst)
+    with open(sidecar + ".tmp", "w", encoding="utf-8") as f:
+        json.dump({"size": src_stat.st_size, "mtime_ns": src_stat.st_mtime_ns,
+                   "offset": offset, "prefix_hash": format_hash(hasher)}, f)
+    os.replace(sidecar + ".tmp", sidecar)
+
+def copy_file_resumable(src, dst, progress=None):
+    """Copy src to dst with an inline hash, recording a verified resume point every RESUME_CHECKPOINT_BYTES.
+
+    If an earlier copy into dst was cut off, its sidecar gives the offset and the hash of the data up to
+    it. The destination prefix is re-hashed and, if it matches and the source is unchanged, the copy
+    continues from there instead of from zero. The kept prefix is reported as
+    progress(offset, transferred=False), since none of it is read from the source again.
+    Returns the hash of the complete data.
+    """
+    src_stat = os.stat(src)
+    offset, hasher = _load_resume_point(src_stat, dst)
+
+    view = memoryview(_get_buffer())
+    with open(src, "rb", buffering=0) as fsrc, open(dst, "r+b" if offset else "wb", buffering=0) as fdst:
+        fsrc.seek(offset)
+        fdst.seek(offset)
+        fdst.truncate(offset)  # Anything past the resume point was never verified
+        _report(progress, offset, transferred=False)
+
+        next_checkpoint = offset + RESUME_CHECKPOINT_BYTES
+        while (count := fsrc.readinto(view)):
+            chunk = view[:count]
+            hasher.update(chunk)
+            _write_all(fdst, chunk)
+            offset += count
+            if offset >= next_checkpoint:
+                os.fsync(fdst.fileno())  # The recorded offset must never be ahead of the data on disk
+                _save_resume_point(src_stat, dst, offset, hasher)
+                next_checkpoint = offset + RESUME_CHECKPOINT_BYTES
+            _report(progress, count)
+
+    discard_resume_state(dst)
+    return format_hash(hasher)
+
+def same_device(src, dst):
+    """True if dst (or the folder it will be created in) is on the same volume as src."""
+    try:
+        return os.stat(src).st_dev == os.stat(os.path.dirname(os.path.abspath(dst))).st_dev
+    except OSError:
+        return False
+
+def fsync_file(path):
+    """Flush a file that was written by another handle (or by the kernel) to stable storage."""
+    with open(path, "rb+") as f:
+        os.fsync(f.fileno())
+
+def legacy_copy(src, dst, progress=None):
+    """The original 1MB read/write loop from process_files_from_prepared, used as the benchmark baseline."""
+    with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+        while (chunk := fsrc.read(LEGACY_CHUNK_SIZE)):
+            fdst.write(chunk)
+            _report(progress, len(chunk))
+    return "legacy"
+
+def parse_size(text):
+    """Parse sizes such as 100M or 10G into bytes."""
+    units = {"K": 1024, "M": 1024 ** 2, "G": 1024 ** 3}
+    text = text.strip().upper()
+    if text[-1:] in units:
+        return int(float(text[:-1]) * units[text[-1]])
+    return int(text)
+
+def benchmark(folder, sizes, runs=1):
+    """Time copy_file and the hashed, resumable copy against the legacy loop on generated files inside folder."""
+    print(f"{'size':>10} {'engine':>16} {'method':>16} {'seconds':>9} {'MB/s':>9}")
+    for size in sizes:
+        src = os.path.join(folder, f"copy_bench_{size}.bin")
+        dst = src + ".copy"
+        with open(src, "wb") as f:
+            block = os.urandom(min(size, 4 * 1024 * 1024))
+            written = 0
+            while written < size:
+                written += f.write(block[:size - written])
+        try:
+            resumable = lambda src, dst: copy_file_resumable(src, dst).split(":")[0]  # Returns the hash, show its algorithm
+            for name, engine in (("legacy", legacy_copy), ("copy_engine", copy_file), ("resumable+hash", resumable)):
+                for _ in range(runs):
+                    start = time.perf_counter()
+                    method = engine(src, dst)
+                    elapsed = time.perf_counter() - start
+                    os.remove(dst)
+                    print(f"{size / 1024 ** 2:>8.0f}MB {name:>16} {method:>16} {elapsed:>9.2f} {size / 1024 ** 2 / elapsed:>9.0f}")
+        finally:
+            os.remove(src)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the file copy engine against the legacy read/write loop.")
+    parser.add_argument("folder", help="folder to create the test files in (put it on the filesystem you care about)")
+    parser.add_argument("--sizes", default="100M,1G,10G", help="comma separated file sizes, e.g. 100M,1G,10G")
+    parser.add_argument("--runs", type=int, default=1, help="runs per engine and size")
+    args = parser.parse_args()
+    benchmark(args.folder, [parse_size(size) for size in args.sizes.split(",")], args.runs)
@@ -0,0 +1,173 @@
+import os
+import time
+import queue
+import argparse
+import threading
+from tqdm import tqdm
+import copy_engine  # Kernel-side file copies with a readinto fallback
+
+# Configurable settings
+WORKERS_PER_DEVICE = 2  # Concurrent transfers reading from the same source drive
+MAX_WORKERS = 4  # Concurrent transfers overall
+MAX_BANDWIDTH = 0  # Overall bytes per second, 0 = unlimited
+
+class TransferCancelled(Exception):
+    """Raised inside a transfer's progress callback once the scheduler has been asked to stop."""
+
+def get_device(path):
+    """Return the device id of the volume holding path, or the path's drive/root if it can't be read."""
+    try:
+        return os.stat(path).st_dev
+    except OSError:
+        return os.path.splitdrive(os.path.abspath(path))[0] or os.sep
+
+def make_throttle(max_bandwidth):
+    """Return a callback that sleeps just long enough to keep the combined rate under max_bandwidth."""
+    if not max_bandwidth:
+        return lambda count: None
+
+    lock = threading.Lock()
+    state = {"start": time.monotonic(), "bytes": 0}
+
+    def throttle(count):
+        with lock:
+            state["bytes"] += count
+            delay = state["bytes"] / max_bandwidth - (time.monotonic() - state["start"])
+        if delay > 0:
+            time.sleep(delay)
+
+    return throttle
+
+def run_transfers(tasks, transfer, on_result, workers_per_device=WORKERS_PER_DEVICE,
+                  max_workers=MAX_WORKERS, max_bandwidth=MAX_BANDWIDTH):
+    """Run transfers grouped by source device and report each one back on the calling thread.
+
+    tasks are dicts with at least "src" and "size"; within a device they start in list order.
+    transfer(task, progress) does the work and must call progress(bytes) as data moves. Bytes that
+    never cross the wire (a same-volume rename, the kept part of a resumed copy) are reported with
+    progress(bytes, transferred=False): they move the bar but aren't charged to the bandwidth limit.
+    on_result(task, error, started) runs on the calling thread for every task, so callers can update
+    their journal without locking. On KeyboardInterrupt running transfers are cancelled at their next
+    progress update, the remaining tasks are reported as cancelled, and the interrupt is re-raised.
+    """
+    by_device = {}
+    for task in tasks:
+        by_device.setdefault(get_device(task["src"]), queue.SimpleQueue()).put(task)
+
+    slots = threading.BoundedSemaphore(max(1, max_workers))
+    results = queue.Queue()
+    stop = threading.Event()
+    throttle = make_throttle(max_bandwidth)
+    bar_lock = threading.Lock()
+    total_bytes = sum(task["size"] for task in tasks)
+
+    with tqdm(total=total_bytes, unit='B', unit_scale=True, desc=f"Transferring ({len(by_device)} drives)") as byte_bar, \
+            tqdm(total=len(tasks), unit="file", desc="Files") as file_bar:
+
+        def progress(count, transferred=True):
+            if stop.is_set():
+                raise TransferCancelled()
+            with bar_lock:
+                byte_bar.update(count)
+            if transferred:
+                throttle(count)
+
+        def worker(device_queue):
+            while True:
+                try:
+                    task = device_queue.get_nowait()
+                except queue.Empty:
+                    return
+                if stop.is_set():
+                    results.put((task, TransferCancelled(), False))
+                    continue
+                with slots:
+                    if stop.is_set():
+                        results.put((task, TransferCancelled(), False))
+                        continue
+                    try:
+                        transfer(task, progress)
+                        results.put((task, None, True))
+                    except BaseException as e:
+                        results.put((task, e, True))
+
+        threads = []
+        for device_queue in by_device.values():
+            for _ in range(max(1, min(workers_per_device, device_queue.qsize()))):
+                thread = threading.Thread(target=worker, args=(device_queue,), daemon=True)
+                thread.start()
+                threads.append(thread)
+
+        reported = 0
+        interrupted = False
+        while reported < len(tasks):
+            try:
+                task, error, started = results.get(timeout=0.5)  # Timeout keeps Ctrl+C responsive on Windows
+            except queue.Empty:
+                continue
+            except KeyboardInterrupt:
+                stop.set()
+                interrupted = True
+                continue
+            on_result(task, error, started)
+            reported += 1
+            with bar_lock:
+                file_bar.update(1)
+
+        for thread in threads:
+            thread.join()
+
+    if interrupted:
+        raise KeyboardInterrupt
+
+def benchmark(folder, file_count=8, file_size=256 * 1024 * 1024, worker_counts=(1, 2, 4)):
+    """Copy the same generated files with 1, 2 and 4 workers and print the throughput of each run."""
+    src_folder = os.path.join(folder, "scheduler_bench_src")
+    dst_folder = os.path.join(folder, "scheduler_bench_dst")
+    os.makedirs(src_folder, exist_ok=True)
+    os.makedirs(dst_folder, exist_ok=True)
+
+    tasks = []
+    block = os.urandom(min(file_size, 4 * 1024 * 1024))
+    for i in range(file_count):
+        src = os.path.join(src_folder, f"file_{i}.bin")
+        with open(src, "wb") as f:
+            written = 0
+            while written < file_size:
+                written += f.write(block[:file_size - written])
+        tasks.append({"src": src, "dst": os.path.join(dst_folder, f"file_{i}.bin"), "size": file_size})
+
+    def transfer(task, progress):
+        copy_engine.copy_file(task["src"], task["dst"], progress=progress)
+
+    def on_result(task, error, started):
+        if error is not None:
+            print(f"Benchmark copy failed for {task['src']}: {error}")
+
+    rows = []
+    try:
+        for workers in worker_counts:
+            start = time.perf_counter()
+            run_transfers(tasks, transfer, on_result, workers_per_device=workers, max_workers=workers)
+            elapsed = time.perf_counter() - start
+            rows.append((workers, elapsed))
+            for task in tasks:
+                os.remove(task["dst"])
+    finally:
+        for task in tasks:
+            os.remove(task["src"])
+        os.rmdir(src_folder)
+        os.rmdir(dst_folder)
+
+    total_mb = file_count * file_size / 1024 ** 2
+    print(f"\n{'workers':>8} {'seconds':>9} {'MB/s':>9}")
+    for workers, elapsed in rows:
+        print(f"{workers:>8} {elapsed:>9.2f} {total_mb / elapsed:>9.0f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the copy scheduler with 1, 2 and 4 workers.")
+    parser.add_argument("folder", help="folder to create the test files in")
+    parser.add_argument("--files", type=int, default=8, help="number of files to copy per run")
+    parser.add_argument("--size", default="256M", help="size of each file, e.g. 256M or 2G")
+    args = parser.parse_args()
+    benchmark(args.folder, args.files, copy_engine.parse_size(args.size))
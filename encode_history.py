@@ -0,0 +1,110 @@
+import time
+import sqlite_store  # History lives in a small SQLite file
+
+# Configurable settings
+ENCODE_HISTORY_FILE = "encode_history.db"
+HISTORY_WINDOW = 20  # Recent runs per preset used to learn its throughput
+MIN_HISTORY_RUNS = 3  # Below this the planner keeps using its default rates
+TREND_WEEKS = 8  # Weeks of fps history shown by the report
+OUTCOMES = ("kept", "retag", "errored", "skipped")
+
+_db = sqlite_store.Database(ENCODE_HISTORY_FILE, [
+    "CREATE TABLE IF NOT EXISTS encodes ("
+    "id INTEGER PRIMARY KEY, finished_at REAL, input_file TEXT, preset TEXT, "
+    "input_size INTEGER, output_size INTEGER, duration REAL, width INTEGER, height INTEGER, "
+    "frame_rate REAL, wall_time REAL, avg_fps REAL, outcome TEXT)"
+])
+
+def close():
+    """Close the history database."""
+    _db.close()
+
+def record_encode(input_file, preset_key, summary, input_size, output_size, wall_time, outcome, avg_fps=None):
+    """Store one finished encode. summary is the probe_cache.summarize() result for the input,
+    output_size is None if the encode produced nothing and outcome is one of OUTCOMES.
+    avg_fps is HandBrake's own average if it reported one; otherwise it is worked out from the wall time."""
+    summary = summary or {}
+    frames = (summary.get("duration") or 0) * (summary.get("frame_rate") or 0)
+    if avg_fps is None and frames and wall_time:
+        avg_fps = frames / wall_time
+    with _db.lock:
+        connection = _db.connect()
+        connection.execute(
+            "INSERT INTO encodes (finished_at, input_file, preset, input_size, output_size, duration, "
+            "width, height, frame_rate, wall_time, avg_fps, outcome) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (time.time(), input_file, preset_key, input_size, output_size, summary.get("duration"),
+             summary.get("width"), summary.get("height"), summary.get("frame_rate"), wall_time, avg_fps, outcome)
+        )
+        connection.commit()
+
+def get_preset_rates(window=HISTORY_WINDOW, min_runs=MIN_HISTORY_RUNS):
+    """Learn each preset's throughput from its most recent runs.
+
+    Returns {preset: {"pixel_rate": pixels encoded per second, "output_ratio": output/input bytes,
+    "bits_per_pixel": output bits per encoded pixel}} for presets with at least min_runs usable runs.
+    Pixel rate is fps times frame area, so one number per preset covers every resolution.
+    """
+    with _db.lock:
+        rows = _db.connect().execute(
+            "SELECT preset, input_size, output_size, duration, width, height, frame_rate, wall_time "
+            "FROM encodes WHERE outcome IS NOT 'errored' ORDER BY finished_at DESC"
+        ).fetchall()
+
+    runs = {}
+    for preset, input_size, output_size, duration, width, height, frame_rate, wall_time in rows:
+        if not (duration and width and height and frame_rate and wall_time and input_size and output_size):
+            continue
+        preset_runs = runs.setdefault(preset, [])
+        if len(preset_runs) < window:
+            preset_runs.append((duration * frame_rate * width * height, wall_time, input_size, output_size))
+
+    rates = {}
+    for preset, preset_runs in runs.items():
+        if len(preset_runs) < min_runs:
+            continue
+        pixels = sum(run[0] for run in preset_runs)
+        seconds = sum(run[1] for run in preset_runs)
+        input_bytes = sum(run[2] for run in preset_runs)
+        kept_bytes = sum(min(run[3], run[2]) for run in preset_runs)  # A bigger output is thrown away
+        output_bits = sum(run[3] for run in preset_runs) * 8
+        rates[preset] = {"pixel_rate": pixels / seconds, "output_ratio": kept_bytes / input_bytes,
+                         "bits_per_pixel": output_bits / pixels}
+    return rates
+
+def print_report(trend_weeks=TREND_WEEKS):
+    """Print bytes saved and outcomes per preset, then each preset's weekly average fps."""
+    with _db.lock:
+        connection = _db.connect()
+        totals = connection.execute(
+            "SELECT preset, COUNT(*), "
+            "SUM(CASE WHEN outcome = 'kept' THEN 1 ELSE 0 END), "
+            "SUM(CASE WHEN outcome = 'retag' THEN 1 ELSE 0 END), "
+            "SUM(CASE WHEN outcome = 'errored' THEN 1 ELSE 0 END), "
+            "SUM(CASE WHEN outcome = 'skipped' THEN 1 ELSE 0 END), "
+            "SUM(CASE WHEN outcome = 'kept' THEN input_size - output_size ELSE 0 END), "
+            "SUM(CASE WHEN outcome = 'kept' THEN input_size ELSE 0 END), "
+            "SUM(wall_time), AVG(avg_fps) "
+            "FROM encodes GROUP BY preset ORDER BY preset"
+        ).fetchall()
+        trends = connection.execute(
+            "SELECT preset, strftime('%Y-W%W', finished_at, 'unixepoch', 'localtime') AS week, "
+            "COUNT(*), AVG(avg_fps), SUM(duration * frame_rate * width * height) / SUM(wall_time) "
+            "FROM encodes WHERE outcome IN ('kept', 'retag') AND avg_fps IS NOT NULL "
+            "AND finished_at >= ? GROUP BY preset, week ORDER BY preset, week",
+            (time.time() - trend_weeks * 7 * 86400,)
+        ).fetchall()
+
+    if not totals:
+        print("No encodes recorded yet.")
+        return
+
+    print(f"{'preset':>8} {'runs':>6} {'kept':>6} {'retag':>6} {'errored':>8} {'skipped':>8} {'saved GB':>10} {'saved %':>8} {'hours':>7} {'avg fps':>8}")
+    for preset, runs, kept, retag, errored, skipped, saved, kept_input, wall_time, avg_fps in totals:
+        saved_percent = saved / kept_input * 100 if kept_input else 0
+        print(f"{preset:>8} {runs:>6} {kept:>6} {retag:>6} {errored:>8} {skipped:>8} {(saved or 0) / 1024 ** 3:>10.1f} "
+              f"{saved_percent:>7.1f}% {(wall_time or 0) / 3600:>7.1f} {avg_fps or 0:>8.1f}")
+
+    print(f"\nWeekly fps, last {trend_weeks} weeks")
+    print(f"{'preset':>8} {'week':>9} {'runs':>6} {'avg fps':>8} {'Mpx/s':>8}")
+    for preset, week, runs, avg_fps, pixel_rate in trends:
+        print(f"{preset:>8} {week:>9} {runs:>6} {avg_fps:>8.1f} {(pixel_rate or 0) / 1e6:>8.1f}")
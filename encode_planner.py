@@ -0,0 +1,151 @@
+import time
+import datetime
+import encode_history  # Recorded past encodes, used to learn per-preset throughput
+
+# Configurable settings
+ORDER_POLICIES = ("size", "sjf", "savings", "deadline")
+DEFAULT_ORDER_POLICY = "savings"
+DEFAULT_PIXEL_RATES = {  # Pixels encoded per second before any history exists (fps x width x height)
+    "kids": 1920 * 1080 * 90,
+    "2160": 3840 * 2160 * 12,
+    "default": 1920 * 1080 * 60
+}
+DEFAULT_OUTPUT_RATIOS = {  # Expected output size as a fraction of the input
+    "kids": 0.4,
+    "2160": 0.5,
+    "default": 0.5
+}
+DEFAULT_BITS_PER_PIXEL = {  # Output bits per encoded pixel before any history exists
+    "kids": 0.03,
+    "2160": 0.04,
+    "default": 0.04
+}
+FALLBACK_BYTES_PER_SECOND = 2 * 1024 * 1024  # Encode speed assumed for files ffprobe can't read
+
+# Skip prediction: files whose predicted output is this large a fraction of the input
+SKIP_MODES = ("off", "predict", "sample")
+DEFAULT_SKIP_MODE = "off"  # Files are only moved on request, and only for presets with learned rates
+SKIP_RATIO = 1.0  # ...are moved to retag without encoding (flagged instead until the preset's rates are learned)
+FLAG_RATIO = 0.85  # ...are flagged, and sample-encoded first in sample mode
+EFFICIENT_CODECS = {"hevc", "av1", "vp9"}  # Inputs already in these codecs are flagged from a lower ratio
+EFFICIENT_FLAG_RATIO = 0.7
+SAMPLE_COUNT = 3  # Segments encoded in sample mode, spread evenly through the file
+SAMPLE_SECONDS = 30
+
+def get_rates():
+    """Per-preset pixel rate, output ratio and bits per pixel: learned from history where there is enough,
+    defaults otherwise. "learned" tells the two apart."""
+    learned = encode_history.get_preset_rates()
+    return {
+        preset: {**learned[preset], "learned": True} if preset in learned else
+                {"pixel_rate": DEFAULT_PIXEL_RATES[preset],
+                 "output_ratio": DEFAULT_OUTPUT_RATIOS[preset],
+                 "bits_per_pixel": DEFAULT_BITS_PER_PIXEL[preset],
+                 "learned": False}
+        for preset in DEFAULT_PIXEL_RATES
+    }
+
+def estimate_job(job, rates):
+    """Fill in job["est_seconds"], job["est_output"], job["est_saved"] and job["prediction"] from its
+    probed duration, resolution and preset.
+
+    job needs "size", "preset_key" and "media" (a probe_cache.summarize() result, or None).
+    """
+    rate = rates.get(job["preset_key"], rates["default"])
+    media = job.get("media") or {}
+    frames = (media.get("duration") or 0) * (media.get("frame_rate") or 0)
+    pixels = frames * (media.get("width") or 0) * (media.get("height") or 0)
+    if pixels:
+        job["est_seconds"] = pixels / rate["pixel_rate"]
+        job["est_output"] = pixels * rate["bits_per_pixel"] / 8
+    else:
+        job["est_seconds"] = job["size"] / FALLBACK_BYTES_PER_SECOND
+        job["est_output"] = job["size"] * rate["output_ratio"]
+    job["est_saved"] = max(0, job["size"] - job["est_output"])
+    job["prediction"] = predict_outcome(job, rate["learned"])
+    return job
+
+def predict_outcome(job, learned):
+    """Return "skip" if the output is expected to be no smaller than the input, "flag" if it is
+    borderline, otherwise "encode". Files without a usable probe are always encoded, and a prediction
+    from default rates (learned False) is never more than a flag."""
+    media = job.get("media") or {}
+    if not media.get("duration") or not job["size"]:
+        return "encode"
+    ratio = job["est_output"] / job["size"]
+    flag_ratio = EFFICIENT_FLAG_RATIO if media.get("video_codec") in EFFICIENT_CODECS else FLAG_RATIO
+    if ratio >= SKIP_RATIO and learned:
+        return "skip"
+    if ratio >= flag_ratio:
+        return "flag"
+    return "encode"
+
+def get_sample_starts(duration, count=SAMPLE_COUNT, seconds=SAMPLE_SECONDS):
+    """Start times of count evenly spaced sample segments, or [] if the file is too short to sample."""
+    if duration < count * seconds * 2:
+        return []
+    step = duration / (count + 1)
+    return [int(step * (i + 1) - seconds / 2) for i in range(count)]
+
+def extrapolate_output(sample_sizes, duration, seconds=SAMPLE_SECONDS):
+    """Scale the total size of the sample encodes up to the whole duration."""
+    return sum(sample_sizes) * duration / (len(sample_sizes) * seconds)
+
+def order_jobs(jobs, policy=DEFAULT_ORDER_POLICY, deadline=None, slots=1):
+    """Return the jobs in the order they should be encoded. Non-MP4 files always go first.
+
+    size:     smallest file first (the original order)
+    sjf:      shortest estimated encode first
+    savings:  most bytes saved per encode hour first
+    deadline: like savings, but only the jobs expected to finish before the deadline timestamp,
+              sharing slots encode slots between them
+    """
+    if policy == "size":
+        key = lambda job: job["size"]
+    elif policy == "sjf":
+        key = lambda job: job["est_seconds"]
+    elif policy in ("savings", "deadline"):
+        key = lambda job: -job["est_saved"] / max(job["est_seconds"], 1)
+    else:
+        raise ValueError(f"Unknown order policy: {policy}")
+    ordered = sorted(jobs, key=lambda job: (job["input_file"].lower().endswith(".mp4"), key(job)))
+
+    if policy != "deadline" or deadline is None:
+        return ordered
+
+    # Each job uses its slots for its whole estimated run, so the batch has slots x time left to spend
+    time_left = deadline - time.time()
+    budget = slots * time_left
+    selected = []
+    for job in ordered:
+        cost = job["est_seconds"] * job["slots"]
+        if job["est_seconds"] <= time_left and cost <= budget:
+            selected.append(job)
+            budget -= cost
+    return selected
+
+def parse_deadline(value):
+    """Turn 'HH:MM' into the timestamp of its next occurrence (tonight, or tomorrow if already past)."""
+    hour, minute = (int(part) for part in value.split(":"))
+    now = datetime.datetime.now()
+    deadline = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+    if deadline <= now:
+        deadline += datetime.timedelta(days=1)
+    return deadline.timestamp()
+
+def format_duration(seconds):
+    """Format seconds as e.g. '3h 05m'."""
+    minutes = int(seconds // 60)
+    return f"{minutes // 60}h {minutes % 60:02d}m"
+
+def print_plan(jobs, policy, skipped=0):
+    """Print a short summary of the planned batch. skipped counts jobs left out by the deadline."""
+    total_seconds = sum(job["est_seconds"] for job in jobs)
+    total_saved = sum(job["est_saved"] for job in jobs)
+    print(f"Queue ({policy}): {len(jobs)} files, ~{format_duration(total_seconds)} of encoding, "
+          f"~{total_saved / 1024 ** 3:.1f} GB expected savings")
+    if skipped:
+        print(f"{skipped} files deferred: not expected to finish before the deadline")
+    flagged = sum(1 for job in jobs if job["prediction"] == "flag")
+    if flagged:
+        print(f"{flagged} files flagged as unlikely to shrink much")
@@ -0,0 +1,249 @@
+import os
+import sys
+import time
+import ctypes
+import select
+import struct
+
+# Configurable settings
+STABLE_SECONDS = 30  # A new file is ready once its size and mtime have not changed for this long
+POLL_INTERVAL = 5  # Seconds between directory checks in polling mode, and between checks of pending files
+
+# inotify event bits (linux/inotify.h)
+IN_CLOSE_WRITE = 0x008
+IN_MOVED_FROM = 0x040
+IN_MOVED_TO = 0x080
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+IN_DELETE_SELF = 0x400
+IN_Q_OVERFLOW = 0x4000
+IN_IGNORED = 0x8000
+IN_ISDIR = 0x40000000
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF
+EVENT_HEADER = struct.Struct("iIII")  # wd, mask, cookie, name length
+
+def load_inotify():
+    """Return libc if it provides inotify (Linux), otherwise None."""
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        libc = ctypes.CDLL(None, use_errno=True)
+    except OSError:
+        return None
+    if not hasattr(libc, "inotify_init1"):
+        return None
+    libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+    return libc
+
+class FolderWatcher:
+    """Keeps track of the video files under a folder and reports new ones once they stop changing.
+
+    With inotify the kernel reports every create, move and delete. Without it, each poll stats only
+    the directories and lists just the ones whose mtime changed. Either way a file is stat'ed when it
+    is first seen and while it is pending, never again afterwards.
+    """
+
+    def __init__(self, root, extensions, excluded_dirs=(), stable_seconds=STABLE_SECONDS,
+                 poll_interval=POLL_INTERVAL, use_inotify=True):
+        self.root = root
+        self.extensions = tuple(ext.lower() for ext in extensions)
+        self.excluded_dirs = set(excluded_dirs)
+        self.stable_seconds = stable_seconds
+        self.poll_interval = poll_interval
+        self.files = set()  # Every wanted file seen so far, ready or pending
+        self.pending = {}  # path -> (size, mtime_ns, time it was last seen changing)
+        self.dirs = {}  # dir -> mtime_ns, used for change detection when polling
+        self._ready = []
+        self._removed = []
+        self._last_check = 0
+        self._libc = load_inotify() if use_inotify else None
+        self._fd = None
+        self._watches = {}  # wd -> dir
+        if self._libc:
+            self._fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+            if self._fd < 0:
+                self._libc = None
+                self._fd = None
+        self._scan_tree(root, initial=True)
+
+    @property
+    def mode(self):
+        return "inotify" if self._fd is not None else "polling"
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    def _wanted_file(self, name):
+        return name.lower().endswith(self.extensions)
+
+    def _add_watch(self, directory):
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(directory), WATCH_MASK)
+        if wd >= 0:
+            self._watches[wd] = directory
+
+    def _scan_tree(self, top, initial=False):
+        """List a directory tree and take in every file in it.
+
+        On the first scan files already older than the stability window are ready straight away,
+        matching what a full walk used to do. Files found later always wait out the window."""
+        stack = [top]
+        while stack:
+            directory = stack.pop()
+            try:
+                self.dirs[directory] = os.stat(directory).st_mtime_ns  # Stat before listing so later changes are seen
+                if self._fd is not None:
+                    self._add_watch(directory)
+                with os.scandir(directory) as it:
+                    entries = list(it)
+            except OSError:
+                continue
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    if entry.name not in self.excluded_dirs:
+                        stack.append(entry.path)
+                elif self._wanted_file(entry.name) and entry.path not in self.files:
+                    self._add_file(entry.path, entry, initial)
+
+    def _add_file(self, path, entry=None, initial=False):
+        try:
+            st = entry.stat() if entry is not None else os.stat(path)
+        except OSError:
+            return
+        self.files.add(path)
+        now = time.time()
+        if initial and now - st.st_mtime > self.stable_seconds:
+            self._ready.append((path, st.st_size))
+        else:
+            self.pending[path] = (st.st_size, st.st_mtime_ns, now)
+
+    def _remove_file(self, path):
+        if path in self.files:
+            self.files.discard(path)
+            self.pending.pop(path, None)
+            self._removed.append(path)
+
+    def _remove_tree(self, directory):
+        prefix = directory + os.sep
+        for path in [path for path in self.files if path.startswith(prefix)]:
+            self._remove_file(path)
+        for sub in [sub for sub in self.dirs if sub == directory or sub.startswith(prefix)]:
+            del self.dirs[sub]
+        if self._fd is not None:
+            for wd, watched in list(self._watches.items()):
+                if watched == directory or watched.startswith(prefix):
+                    self._libc.inotify_rm_watch(self._fd, wd)
+                    del self._watches[wd]
+
+    def _rescan_changed_dirs(self):
+        """Polling mode: list only the directories whose mtime changed since the last check."""
+        for directory, old_mtime in list(self.dirs.items()):
+            if directory not in self.dirs:
+                continue  # Removed along with a parent earlier in this pass
+            try:
+                mtime = os.stat(directory).st_mtime_ns
+            except OSError:
+                self._remove_tree(directory)
+                continue
+            if mtime == old_mtime:
+                continue
+            self.dirs[directory] = mtime
+            try:
+                with os.scandir(directory) as it:
+                    entries = list(it)
+            except OSError:
+                continue
+            names = set()
+            for entry in entries:
+                names.add(entry.path)
+                if entry.is_dir(follow_symlinks=False):
+                    if entry.name not in self.excluded_dirs and entry.path not in self.dirs:
+                        self._scan_tree(entry.path)
+                elif self._wanted_file(entry.name) and entry.path not in self.files:
+                    self._add_file(entry.path, entry)
+            for path in [p for p in self.files if os.path.dirname(p) == directory and p not in names]:
+                self._remove_file(path)
+            for sub in [d for d in self.dirs if os.path.dirname(d) == directory and d not in names]:
+                self._remove_tree(sub)
+
+    def _read_events(self):
+        """inotify mode: apply every queued event."""
+        while True:
+            try:
+                data = os.read(self._fd, 64 * 1024)
+            except BlockingIOError:
+                return
+            self._apply_events(data)
+
+    def _apply_events(self, data):
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b"\0"))
+            offset += length
+
+            if mask & IN_Q_OVERFLOW:
+                self._scan_tree(self.root)  # Events were lost: pick up anything new the slow way
+                continue
+            directory = self._watches.get(wd)
+            if mask & IN_IGNORED:
+                self._watches.pop(wd, None)
+                continue
+            if directory is None or not name:
+                continue
+            path = os.path.join(directory, name)
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO) and name not in self.excluded_dirs:
+                    self._scan_tree(path)
+                elif mask & (IN_DELETE | IN_MOVED_FROM):
+                    self._remove_tree(path)
+            elif self._wanted_file(name):
+                if mask & (IN_DELETE | IN_MOVED_FROM):
+                    self._remove_file(path)
+                elif mask & (IN_CREATE | IN_MOVED_TO | IN_CLOSE_WRITE):
+                    self.files.discard(path)  # Rewritten in place: wait for it to settle again
+                    self.pending.pop(path, None)
+                    self._add_file(path)
+
+    def _check_pending(self):
+        """Stat the pending files and move the ones that have stopped changing to the ready list."""
+        now = time.time()
+        for path, (size, mtime_ns, changed_at) in list(self.pending.items()):
+            try:
+                st = os.stat(path)
+            except OSError:
+                self._remove_file(path)
+                continue
+            if (st.st_size, st.st_mtime_ns) != (size, mtime_ns):
+                self.pending[path] = (st.st_size, st.st_mtime_ns, now)
+            elif now - changed_at >= self.stable_seconds:
+                del self.pending[path]
+                self._ready.append((path, st.st_size))
+
+    def poll(self, timeout=0):
+        """Wait up to timeout seconds for changes. Returns (ready [(path, size)], removed [path])."""
+        deadline = time.monotonic() + timeout
+        while True:
+            if self._fd is not None:
+                self._read_events()
+            if time.monotonic() - self._last_check >= self.poll_interval:
+                self._last_check = time.monotonic()
+                if self._fd is None:
+                    self._rescan_changed_dirs()
+                self._check_pending()
+
+            if self._ready or self._removed:
+                ready, removed = self._ready, self._removed
+                self._ready, self._removed = [], []
+                return ready, removed
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return [], []
+            wait = min(remaining, max(0.05, self._last_check + self.poll_interval - time.monotonic()))
+            if self._fd is not None:
+                select.select([self._fd], [], [], wait)
+            else:
+                time.sleep(wait)
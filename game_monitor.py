@@ -0,0 +1,135 @@
+import os
+import re
+import time
+import argparse
+import threading
+import psutil
+
+# Configurable settings
+POLL_INTERVAL = 1.0  # Seconds between checks for new or exited processes
+
+def compile_prefixes(folders):
+    """One regex matching any of the folder prefixes, longest first so the most specific folder wins.
+
+    Paths on Windows are case-insensitive, so the match is too."""
+    alternatives = "|".join(re.escape(folder) for folder in sorted(folders, key=len, reverse=True))
+    return re.compile(f"({alternatives})", re.IGNORECASE if os.name == "nt" else 0)
+
+class GameMonitor(threading.Thread):
+    """Background thread tracking whether anything is running from one of the game folders.
+
+    psutil.pids() is cheap; looking up an exe path is not. The monitor remembers the game folder
+    (or None) of every PID it has seen, so each poll only looks up processes started since the last one.
+    The state is published as two events, running and clear, so callers can block on either.
+    """
+
+    def __init__(self, game_folders, poll_interval=POLL_INTERVAL):
+        super().__init__(daemon=True)
+        self.pattern = compile_prefixes(game_folders)
+        self.poll_interval = poll_interval
+        self.running = threading.Event()
+        self.clear = threading.Event()
+        self.ignored = set()
+        self._pid_folders = {}  # pid -> matching game folder or None
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+
+    def match(self, exe):
+        """Return the game folder exe lives in, or None."""
+        match = self.pattern.match(exe) if exe else None
+        return match.group(1) if match else None
+
+    def _lookup(self, pid):
+        try:
+            return self.match(psutil.Process(pid).exe())
+        except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess, OSError):
+            return None
+
+    def poll(self):
+        """Update the PID cache and the published state. Returns True if a game is running."""
+        pids = set(psutil.pids())
+        with self._lock:
+            for pid in self._pid_folders.keys() - pids:
+                del self._pid_folders[pid]
+            new_pids = pids - self._pid_folders.keys()
+        found = {pid: self._lookup(pid) for pid in new_pids}
+        with self._lock:
+            self._pid_folders.update(found)
+            running = any(folder and folder not in self.ignored for folder in self._pid_folders.values())
+        if running:
+            self.clear.clear()
+            self.running.set()
+        else:
+            self.running.clear()
+            self.clear.set()
+        return running
+
+    def start(self):
+        """Take the first snapshot before returning, so the state is valid as soon as start() does."""
+        self.poll()
+        super().start()
+
+    def run(self):
+        while not self._stopping.wait(self.poll_interval):
+            self.poll()
+
+    def stop(self):
+        self._stopping.set()
+
+    def is_running(self):
+        return self.running.is_set()
+
+    def current_folder(self):
+        """The game folder of any running, not ignored, game process."""
+        with self._lock:
+            for folder in self._pid_folders.values():
+                if folder and folder not in self.ignored:
+                    return folder
+        return None
+
+    def ignore(self, folder):
+        """Stop treating processes from folder as games and republish the state."""
+        with self._lock:
+            self.ignored.add(folder)
+        self.poll()
+
+    def wait_for_exit(self, timeout=None):
+        """Block until no game is running. Returns False on timeout."""
+        return self.clear.wait(timeout)
+
+def full_scan(game_folders):
+    """The original check: look up every process's exe and compare it against every folder."""
+    for proc in psutil.process_iter(['pid', 'name', 'exe']):
+        try:
+            if proc.info['exe']:
+                for game_folder in game_folders:
+                    if proc.info['exe'].startswith(game_folder):
+                        return True
+        except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
+            pass
+    return False
+
+def benchmark(game_folders, polls=50):
+    """Compare the per-check cost of a full process scan with an incremental monitor poll."""
+    start = time.perf_counter()
+    for _ in range(polls):
+        full_scan(game_folders)
+    full = (time.perf_counter() - start) / polls
+
+    monitor = GameMonitor(game_folders)
+    monitor.poll()
+    start = time.perf_counter()
+    for _ in range(polls):
+        monitor.poll()
+    incremental = (time.perf_counter() - start) / polls
+
+    print(f"{len(psutil.pids())} processes, {len(game_folders)} game folders")
+    print(f"full scan:        {full * 1000:8.2f} ms per check")
+    print(f"incremental poll: {incremental * 1000:8.2f} ms per check")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark game detection: full process scans vs the incremental monitor.")
+    parser.add_argument("folders", nargs="+", help="game folders to look for")
+    parser.add_argument("--polls", type=int, default=50, help="checks to time for each method")
+    args = parser.parse_args()
+    benchmark(args.folders, args.polls)
@@ -4,27 +4,61 @@ import signal
 import subprocess
 import shutil
 import psutil  # For force killing HandBrakeCLI if needed
-import re
 from tqdm import tqdm
 import send2trash  # Add send2trash for sending files to recycle bin
 import time
-import msvcrt  # For detecting keyboard strokes on Windows
+import threading
+import argparse
+import contextlib
+try:
+    import msvcrt  # For detecting keyboard strokes on Windows
+except ImportError:
+    msvcrt = None
+import probe_cache  # Shared on-disk ffprobe result cache
+import encode_history  # Past encodes, for learning per-preset throughput
+import encode_planner  # Queue ordering from estimated encode cost
+import game_monitor  # Background detection of running games
+import folder_watcher  # Incremental discovery of new files for watch mode
+import handbrake_progress  # HandBrakeCLI progress parsing and telemetry
 
 # Configurable settings
 HANDBRAKECLI_DEFAULT_PATH = r"C:\\Tools\\handbrakecli"
+HANDBRAKECLI_EXE = "HandBrakeCLI.exe" if os.name == "nt" else "HandBrakeCLI"
 PRESETS = {
     "kids": "1080p Kids",
     "2160": "4k hdr3",
     "default": "1080p4"
 }
+ENCODE_SLOTS = 2  # Encode capacity shared by all running HandBrakeCLI jobs
+PRESET_SLOTS = {  # How many slots a job with each preset takes
+    "kids": 1,
+    "2160": 2,
+    "default": 1
+}
+GAME_ACTIONS = ("suspend", "lower", "none")  # What happens to running encodes while a game is running
+DEFAULT_GAME_ACTION = "suspend"
+CAPTURE_LOG_FOLDER = None  # Save raw HandBrakeCLI output here, for replaying with handbrake_progress.py
+DURATION_TOLERANCE = 2.0  # Seconds the output may differ from the input before it counts as truncated
+DURATION_TOLERANCE_RATIO = 0.005  # ...or this fraction of the input duration, whichever is larger
+VIDEO_EXTENSIONS = ('.mp4', '.mkv', '.avi', '.mov')
 EXCLUDED_DIRS = ["more", "retag", "$RECYCLE.BIN", "System Volume Information", "errored", "non-eng", "anime"]
 GAME_FOLDERS = ["D:\\Games", "E:\\Games", "D:\\GOG Games", "D:\\XboxGames",
                  "F:\\Emulation\\Emulators", "F:\\Games", "F:\\XboxGames", "G:\\Games",
                    "G:\\SteamLibrary", "G:\\XboxGames"]  # Add paths to game folders here
 
-current_output_file = None
-current_process = None  # Track HandBrakeCLI process
-ignored_game_folders = set()  # Track ignored game folders
+active_jobs = []  # In-flight encodes ({"output_file", "process"}), so an interrupt can clean up all of them
+jobs_lock = threading.RLock()  # Re-entrant: the SIGINT handler runs on the main thread, which may hold it
+slots_changed = threading.Condition(jobs_lock)
+shutting_down = threading.Event()  # Set on interrupt so workers don't treat killed encodes as failures
+games = game_monitor.GameMonitor(GAME_FOLDERS)  # Started on first use
+game_override = threading.Event()  # Set when 'c' is pressed: let encodes run until the game exits
+paused_intervals = []  # (start, end) monotonic times when encodes were suspended, to keep them out of wall times
+
+def get_handbrakecli_executable(handbrakecli_path):
+    """Accept either the HandBrakeCLI folder or the executable itself (e.g. a stub script for testing)."""
+    if os.path.isfile(handbrakecli_path):
+        return handbrakecli_path
+    return os.path.join(handbrakecli_path, HANDBRAKECLI_EXE)
 
 def find_handbrakecli():
     handbrakecli_path = HANDBRAKECLI_DEFAULT_PATH
@@ -52,172 +86,370 @@ def kill_process(process):
         print(f"Error killing HandBrakeCLI: {e}")
 
 def cleanup_on_exit(signal, frame):
-    """Cleanup function for interruptions."""
-    global current_output_file, current_process
+    """Cleanup function for interruptions: stop every running encode and discard its partial output."""
     print("\nProcess interrupted. Cleaning up...")
-
-    if current_process:
-        print(f"Attempting to terminate HandBrakeCLI (PID: {current_process.pid})...")
-        try:
-            current_process.terminate()
-            current_process.wait(timeout=5)
-        except subprocess.TimeoutExpired:
-            print("Process did not terminate in time. Forcing kill...")
-            kill_process(current_process)
-
-    if current_output_file and os.path.exists(current_output_file):
-        try:
-            send2trash.send2trash(current_output_file)
-            print(f"Sent partially encoded file to recycle bin: {current_output_file}")
-        except Exception as e:
-            print(f"Error sending partial file to recycle bin: {e}")
+    shutting_down.set()
+
+    with jobs_lock:
+        jobs = list(active_jobs)
+
+    for job in jobs:
+        process = job["process"]
+        if process:
+            for proc in get_process_tree(process):
+                try:
+                    proc.resume()  # A suspended process can't act on the terminate request
+                except (psutil.NoSuchProcess, psutil.AccessDenied):
+                    pass
+            print(f"Attempting to terminate HandBrakeCLI (PID: {process.pid})...")
+            try:
+                process.terminate()
+                process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                print("Process did not terminate in time. Forcing kill...")
+                kill_process(process)
+
+    for job in jobs:
+        output_file = job["output_file"]
+        if output_file and os.path.exists(output_file):
+            try:
+                send2trash.send2trash(output_file)
+                print(f"Sent partially encoded file to recycle bin: {output_file}")
+            except Exception as e:
+                print(f"Error sending partial file to recycle bin: {e}")
 
     sys.exit(0)
 
 signal.signal(signal.SIGINT, cleanup_on_exit)
 
-def parse_progress(line):
-    """Extracts encoding progress from HandBrakeCLI output."""
-    match = re.search(r'Encoding: task \d+ of \d+, (\d+\.\d+) %', line)
-    return float(match.group(1)) if match else None
+def open_capture_log(input_file):
+    if CAPTURE_LOG_FOLDER is None:
+        return contextlib.nullcontext()
+    os.makedirs(CAPTURE_LOG_FOLDER, exist_ok=True)
+    name = f"{os.path.splitext(os.path.basename(input_file))[0]}.{int(time.time())}.log"
+    return open(os.path.join(CAPTURE_LOG_FOLDER, name), "wb")
 
-def encode_video(input_file, output_file, preset_name, handbrakecli_path):
-    global current_output_file, current_process
-    current_output_file = output_file
+def encode_video(input_file, output_file, preset_name, handbrakecli_path, position=0, extra_args=(), stats=None):
+    """Run HandBrakeCLI, showing its progress. If stats is a dict, the last progress event is stored in it."""
+    job = {"output_file": output_file, "process": None}
+    with jobs_lock:
+        active_jobs.append(job)
 
     command = [
-        os.path.join(handbrakecli_path, "HandBrakeCLI.exe"),
+        get_handbrakecli_executable(handbrakecli_path),
         "--preset-import-gui",
         "-Z", preset_name,
         "-i", input_file,
         "-o", output_file,
+        *extra_args,
     ]
 
     try:
-        with subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, bufsize=1, encoding="utf-8", errors="replace") as process:
-            current_process = process
-            progress_bar = tqdm(total=100, unit="%", desc="Encoding Progress", ncols=80, dynamic_ncols=True, position=0, leave=True)
-            last_progress = 0
-
-            for line in process.stdout:
+        # Unbuffered binary pipe: each read returns whatever HandBrakeCLI has written, up to a large chunk
+        with subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, bufsize=0) as process, \
+                open_capture_log(input_file) as capture_log:
+            job["process"] = process
+            progress_bar = tqdm(total=100, unit="%", desc=f"Encoding {os.path.basename(input_file)}"[:40], ncols=80, dynamic_ncols=True, position=position, leave=False)
+            parser = handbrake_progress.ProgressParser()
+            telemetry = handbrake_progress.TelemetryWriter(input_file, preset_name)
+            last_event = None
+
+            while True:
+                chunk = process.stdout.read(handbrake_progress.READ_CHUNK_SIZE)
+                event = parser.feed(chunk) if chunk else parser.finish()
                 # We suppress output except for progress updates
-                progress = parse_progress(line)
-                if progress is not None:
-                    progress_bar.update(progress - last_progress)
-                    last_progress = progress
+                if event is not None:
+                    last_event = event
+                    progress_bar.n = last_event["overall"]
+                    if last_event["avg_fps"] is not None:
+                        progress_bar.set_postfix_str(f"{last_event['avg_fps']:.1f} fps, pass {last_event['pass']}/{last_event['passes']}", refresh=False)
+                    progress_bar.refresh()
+                    telemetry.write(last_event)
+                if not chunk:
+                    break
+                if capture_log:
+                    capture_log.write(chunk)
 
             progress_bar.close()
             process.wait()
+            if last_event is not None:
+                telemetry.write(last_event, force=True)
+                if stats is not None:
+                    stats.update(last_event)
 
         if process.returncode != 0:
             raise subprocess.CalledProcessError(process.returncode, command)
 
-        print(f"Encoding complete: {output_file}")
+        tqdm.write(f"Encoding complete: {output_file}")
         return True
 
     except subprocess.CalledProcessError as e:
-        print(f"Error encoding video {input_file}: {e}")
-        send2trash.send2trash(output_file)
-        print(f"\nSent partially encoded file to recycle bin: {output_file}")
+        if shutting_down.is_set():
+            return False  # Killed by the interrupt handler, which cleans up the output itself
+        tqdm.write(f"Error encoding video {input_file}: {e}")
+        if os.path.exists(output_file):
+            send2trash.send2trash(output_file)
+            tqdm.write(f"\nSent partially encoded file to recycle bin: {output_file}")
         return False
+    finally:
+        with jobs_lock:
+            active_jobs.remove(job)
+
+def check_output(input_media, output_media):
+    """Compare the output's probe with the input's. Returns a problem description, or None if it looks complete."""
+    if output_media is None:
+        return "ffprobe can't read the output"
+    if not output_media["video_streams"]:
+        return "output has no video"
+    if not output_media["audio_streams"]:
+        return "output has no audio"
+    input_duration = (input_media or {}).get("duration")
+    output_duration = output_media["duration"]
+    if input_duration and output_duration is not None:
+        tolerance = max(DURATION_TOLERANCE, input_duration * DURATION_TOLERANCE_RATIO)
+        if abs(output_duration - input_duration) > tolerance:
+            return f"output runs {output_duration:.0f}s but the input runs {input_duration:.0f}s"
+    return None
 
-def check_audio_tracks(file_path):
-    """Check if the file has at least one audio track using ffprobe."""
-    command = [
-        "ffprobe",
-        "-v", "error",
-        "-select_streams", "a",
-        "-show_entries", "stream=index",
-        "-of", "csv=p=0",
-        file_path
-    ]
-    result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-    return bool(result.stdout.strip())
+def handle_file(input_file, output_file, source_folder, input_media=None):
+    """Keep the output if it is complete and smaller, otherwise set the input aside. Returns the outcome.
 
-def handle_file(input_file, output_file, source_folder):
+    The output is probed once; input_media is the input's probe summary from the pre-encode scan
+    (looked up in the probe cache if not given)."""
     if os.path.exists(output_file):
         input_size = os.path.getsize(input_file)
         output_size = os.path.getsize(output_file)
+        if input_media is None:
+            input_media = probe_cache.summarize(probe_cache.probe_file(input_file))
+        output_media = probe_cache.summarize(probe_cache.probe_file(output_file))
 
         print(f"Size Check - Input: {input_size / (1024 * 1024):.2f} MB | Output: {output_size / (1024 * 1024):.2f} MB")
-
-        if output_size < input_size and check_audio_tracks(output_file):
+        if output_media:
+            print(f"Stream Check - Video: {output_media['video_codec']} | "
+                  f"Audio: {output_media['audio_streams']} ({', '.join(filter(None, output_media['audio_codecs']))}) | "
+                  f"Duration: {output_media['duration'] or 0:.0f}s of {(input_media or {}).get('duration') or 0:.0f}s")
+
+        problem = check_output(input_media, output_media)
+        if problem:
+            send2trash.send2trash(output_file)
+            handle_encoding_error(input_file, source_folder)
+            print(f"⚠️ {problem[0].upper() + problem[1:]}. Moved {input_file} to 'errored' folder for review.")
+            return "errored"
+        if output_size < input_size:
             send2trash.send2trash(input_file)
-            print(f"✅ Sent input file to recycle bin {input_file} (output is smaller and has audio).")
-        else:
-            if not check_audio_tracks(output_file):
-                send2trash.send2trash(output_file)
-                handle_encoding_error(input_file, source_folder)
-                print(f"⚠️ Output has no audio. Moved {input_file} to 'errored' folder for review.")
-            else:
-                send2trash.send2trash(output_file)
-                retag_folder = os.path.join(source_folder, "retag")
-                os.makedirs(retag_folder, exist_ok=True)
-                shutil.move(input_file, os.path.join(retag_folder, os.path.basename(input_file)))
-                print(f"⚠️ Output is not smaller. Moved {input_file} to 'retag' folder for review.")
+            print(f"✅ Sent input file to recycle bin {input_file} (output is smaller and complete).")
+            return "kept"
+        send2trash.send2trash(output_file)
+        move_to_retag(input_file, source_folder)
+        print(f"⚠️ Output is not smaller. Moved {input_file} to 'retag' folder for review.")
+        return "retag"
+    return "errored"  # HandBrakeCLI exited cleanly but wrote nothing
+
+def move_to_retag(input_file, source_folder):
+    retag_folder = os.path.join(source_folder, "retag")
+    os.makedirs(retag_folder, exist_ok=True)
+    shutil.move(input_file, os.path.join(retag_folder, os.path.basename(input_file)))
+
+def skip_encode(job, source_folder, reason):
+    """Move a file predicted not to shrink straight to 'retag' and record it as skipped."""
+    move_to_retag(job["input_file"], source_folder)
+    encode_history.record_encode(job["input_file"], job["preset_key"], job["media"], job["size"], None, 0, "skipped")
+    tqdm.write(f"⏭️ Skipped {job['input_file']} ({reason}). Moved to 'retag' folder for review.")
+
+def sample_encode(job, handbrakecli_path):
+    """Encode a few short segments of the file and extrapolate the full output size.
+
+    Returns None if the file is too short to sample or a sample fails."""
+    duration = job["media"]["duration"]
+    starts = encode_planner.get_sample_starts(duration)
+    if not starts:
+        return None
+    base, _ = os.path.splitext(job["output_file"])
+    sample_sizes = []
+    for i, start in enumerate(starts):
+        sample_file = f"{base}.sample{i}.mp4"
+        try:
+            if not encode_video(job["input_file"], sample_file, job["preset_name"], handbrakecli_path, job["position"],
+                                ["--start-at", f"seconds:{start}", "--stop-at", f"seconds:{encode_planner.SAMPLE_SECONDS}"]):
+                return None
+            sample_sizes.append(os.path.getsize(sample_file))
+        finally:
+            if os.path.exists(sample_file):
+                os.remove(sample_file)
+    return encode_planner.extrapolate_output(sample_sizes, duration)
+
 def handle_encoding_error(input_file, source_folder):
     errored_folder = os.path.join(source_folder, "errored")
     os.makedirs(errored_folder, exist_ok=True)
     shutil.move(input_file, os.path.join(errored_folder, os.path.basename(input_file)))
     print(f"Encoding error. Moved {input_file} to 'errored' folder.")
 
-def get_preset_for_file(file_path, source_folder):
+def get_preset_key(file_path, source_folder):
     relative_path = os.path.relpath(file_path, source_folder)
     folder_name = os.path.dirname(relative_path).lower()
 
     if folder_name == "kids":
-        return PRESETS["kids"]
+        return "kids"
     elif folder_name == "2160":
-        return PRESETS["2160"]
+        return "2160"
     else:
-        return PRESETS["default"]
+        return "default"
+
+def get_preset_for_file(file_path, source_folder):
+    return PRESETS[get_preset_key(file_path, source_folder)]
 
 def wait_for_game_exit():
     """Wait for the game to exit or for the user to press 'c' to continue or 'x' to ignore the current game folder."""
     print("\nGame detected. Pausing processing... Press 'c' to continue anyway or 'x' to ignore the current game folder.")
-    while is_game_running():
-        if msvcrt.kbhit():
+    while not games.wait_for_exit(timeout=0.25):  # Short waits keep key presses responsive
+        if msvcrt and msvcrt.kbhit():
             key = msvcrt.getch().lower()
             if key == b'c':
                 print("\nContinuing processing despite game running.")
+                game_override.set()
                 break
             elif key == b'x':
                 current_game_folder = get_current_game_folder()
                 if current_game_folder:
-                    ignored_game_folders.add(current_game_folder)
+                    games.ignore(current_game_folder)
                     print(f"\nIgnoring game folder: {current_game_folder}")
                 break
-        time.sleep(1)  # Check every second
     else:
         print("\nGame exited. Resuming processing...")
 
-def get_current_game_folder():
-    """Get the folder of the currently running game."""
-    for proc in psutil.process_iter(['pid', 'name', 'exe']):
+def get_process_tree(process):
+    """The psutil processes for a running HandBrakeCLI and all of its children."""
+    try:
+        proc = psutil.Process(process.pid)
+        return [proc] + proc.children(recursive=True)
+    except psutil.NoSuchProcess:
+        return []
+
+def throttle_encodes(action):
+    """Suspend or deprioritise every running encode. Returns [(process, original nice)] to undo it with."""
+    with jobs_lock:
+        processes = [job["process"] for job in active_jobs if job["process"]]
+    throttled = []
+    for process in processes:
+        for proc in get_process_tree(process):
+            try:
+                if action == "suspend":
+                    proc.suspend()
+                    throttled.append((proc, None))
+                else:
+                    original = proc.nice()
+                    proc.nice(psutil.IDLE_PRIORITY_CLASS if os.name == "nt" else 19)
+                    throttled.append((proc, original))
+            except (psutil.NoSuchProcess, psutil.AccessDenied):
+                pass
+    return throttled
+
+def restore_encodes(throttled, action):
+    for proc, original in throttled:
         try:
-            if proc.info['exe']:
-                for game_folder in GAME_FOLDERS:
-                    if proc.info['exe'].startswith(game_folder):
-                        return game_folder
-        except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
+            if action == "suspend":
+                proc.resume()
+            else:
+                proc.nice(original)
+        except psutil.NoSuchProcess:
             pass
-    return None
+        except psutil.AccessDenied:
+            tqdm.write(f"Not allowed to restore the priority of PID {proc.pid}")  # Raising priority needs root on Linux
+
+def game_throttle_loop(action):
+    """Throttle running encodes as soon as a game starts and restore them when it exits (or on 'c')."""
+    while not shutting_down.is_set():
+        games.running.wait()
+        if game_override.is_set() or shutting_down.is_set():
+            games.wait_for_exit()
+            game_override.clear()
+            continue
+        started = time.monotonic()
+        throttled = throttle_encodes(action)
+        if throttled:
+            tqdm.write(f"\nGame detected: {'suspended' if action == 'suspend' else 'lowered the priority of'} "
+                       f"{len(throttled)} encoder processes.")
+        while not games.wait_for_exit(timeout=0.5) and not game_override.is_set() and not shutting_down.is_set():
+            pass
+        restore_encodes(throttled, action)
+        if throttled:
+            tqdm.write("Game gone (or overridden): encoding resumed.")
+            if action == "suspend":
+                with jobs_lock:
+                    paused_intervals.append((started, time.monotonic()))
+        if game_override.is_set():
+            games.wait_for_exit()
+            game_override.clear()
+
+def start_game_throttle(action):
+    """Start the background thread that throttles encodes while a game runs."""
+    if action == "none":
+        return
+    start_game_monitor()
+    threading.Thread(target=game_throttle_loop, args=(action,), daemon=True).start()
+
+def get_paused_seconds(start, end):
+    """How much of the span from start to end encodes spent suspended."""
+    with jobs_lock:
+        return sum(max(0, min(end, pause_end) - max(start, pause_start)) for pause_start, pause_end in paused_intervals)
+
+def start_game_monitor():
+    if not games.is_alive():
+        games.start()
+
+def get_current_game_folder():
+    """Get the folder of the currently running game."""
+    start_game_monitor()
+    return games.current_folder()
 
 def is_game_running():
     """Check if any executable from the specified game folders is running."""
-    for proc in psutil.process_iter(['pid', 'name', 'exe']):
-        try:
-            if proc.info['exe']:
-                for game_folder in GAME_FOLDERS:
-                    if proc.info['exe'].startswith(game_folder) and game_folder not in ignored_game_folders:
-                        return True
-        except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
-            pass
-    return False
-
-def process_folder(source_folder, destination_folder, handbrakecli_path):
-    os.makedirs(destination_folder, exist_ok=True)
+    start_game_monitor()
+    return games.is_running()
 
+def run_encode_job(job, source_folder, handbrakecli_path, slot_state, file_progress, skip_mode):
+    """Encode one file on a worker thread, then hand its slots and progress bar line back."""
+    try:
+        tqdm.write(f"\nProcessing: {os.path.basename(job['input_file'])} - {job['preset_name']}")
+        if job["prediction"] == "flag" and skip_mode == "sample":
+            predicted = sample_encode(job, handbrakecli_path)
+            if shutting_down.is_set():
+                return
+            if predicted is not None:
+                tqdm.write(f"Sample encode predicts {predicted / 1024 ** 2:.0f} MB from {job['size'] / 1024 ** 2:.0f} MB")
+                if predicted >= job["size"] * encode_planner.SKIP_RATIO:
+                    skip_encode(job, source_folder, "sample encode predicts no savings")
+                    return
+        start = time.monotonic()
+        encode_stats = {}
+        encoded = encode_video(job["input_file"], job["output_file"], job["preset_name"], handbrakecli_path, job["position"],
+                               stats=encode_stats)
+        if shutting_down.is_set():
+            return
+        end = time.monotonic()
+        wall_time = end - start - get_paused_seconds(start, end)
+        if encoded:
+            output_size = os.path.getsize(job["output_file"]) if os.path.exists(job["output_file"]) else None
+            outcome = handle_file(job["input_file"], job["output_file"], source_folder, job["media"])
+        else:
+            output_size = None
+            outcome = "errored"
+            handle_encoding_error(job["input_file"], source_folder)
+        encode_history.record_encode(job["input_file"], job["preset_key"], job["media"], job["size"],
+                                     output_size, wall_time, outcome, encode_stats.get("avg_fps"))
+    except Exception as e:
+        tqdm.write(f"Unexpected error processing {job['input_file']}: {e}")
+    finally:
+        with slots_changed:
+            slot_state["free"] += job["slots"]
+            slot_state["positions"].append(job["position"])
+            slot_state["running"] -= 1
+            slot_state["inputs"].discard(job["input_file"])
+            file_progress.update(1)
+            slots_changed.notify_all()
+
+def build_jobs(source_folder, destination_folder):
+    """Find every video to encode and estimate its cost. Returns unordered job dicts."""
     all_files = []
     for root, dirs, files in os.walk(source_folder):
         for d in EXCLUDED_DIRS:
@@ -225,68 +457,173 @@ def process_folder(source_folder, destination_folder, handbrakecli_path):
                 dirs.remove(d)
         
         for filename in files:
-            if filename.lower().endswith(('.mp4', '.mkv', '.avi', '.mov')):
+            if filename.lower().endswith(VIDEO_EXTENSIONS):
                 file_path = os.path.join(root, filename)
                 file_size = os.path.getsize(file_path)
                 all_files.append((file_path, file_size))
 
-    if not all_files:
-        print("No files found to process.")
+    rates = encode_planner.get_rates()
+    return [make_job(file_path, file_size, source_folder, destination_folder, rates) for file_path, file_size in all_files]
+
+def make_job(file_path, file_size, source_folder, destination_folder, rates):
+    """Build the job dict for one input file, with its probe and cost estimates."""
+    # Non-MP4 outputs get an .mp4 extension
+    filename = os.path.basename(file_path)
+    if not filename.lower().endswith('.mp4'):
+        filename = os.path.splitext(filename)[0] + ".mp4"
+    preset_key = get_preset_key(file_path, source_folder)
+    return encode_planner.estimate_job({
+        "input_file": file_path,
+        "output_file": os.path.join(destination_folder, filename),
+        "size": file_size,
+        "media": probe_cache.summarize(probe_cache.probe_file(file_path)),
+        "preset_key": preset_key,
+        "preset_name": PRESETS[preset_key],
+        "slots": max(1, min(PRESET_SLOTS.get(preset_key, 1), ENCODE_SLOTS)),  # Never more than the pool holds
+    }, rates)
+
+def skip_predicted(jobs, source_folder, skip_mode):
+    """Set aside the jobs predicted not to shrink and return the rest."""
+    if skip_mode == "off":
+        return jobs
+    for job in jobs:
+        if job["prediction"] == "skip":
+            skip_encode(job, source_folder, f"predicted output ~{job['est_output'] / 1024 ** 2:.0f} MB "
+                                            f"from {job['size'] / 1024 ** 2:.0f} MB")
+    return [job for job in jobs if job["prediction"] != "skip"]
+
+def new_slot_state():
+    # inputs holds the input files of the running encodes
+    return {"free": ENCODE_SLOTS, "running": 0, "positions": list(range(ENCODE_SLOTS, 0, -1)), "inputs": set()}
+
+def start_job(job, source_folder, handbrakecli_path, slot_state, file_progress, deadline, skip_mode):
+    """Wait for the job's slots and any running game, then start it on a worker thread.
+
+    Returns False if the job was dropped because it can no longer finish before the deadline."""
+    with slots_changed:
+        while slot_state["free"] < job["slots"]:
+            slots_changed.wait(timeout=1)  # The timeout keeps Ctrl+C responsive
+
+    if is_game_running():
+        wait_for_game_exit()
+
+    if deadline is not None and time.time() + job["est_seconds"] > deadline:
+        tqdm.write(f"Skipping {os.path.basename(job['input_file'])}: not expected to finish before the deadline")
+        file_progress.update(1)
         return False
 
-    # Separate non-MP4 and MP4 files
-    non_mp4_files = [file for file in all_files if not file[0].lower().endswith('.mp4')]
-    mp4_files = [file for file in all_files if file[0].lower().endswith('.mp4')]
-
-    # Sort files by size (smallest first)
-    non_mp4_files.sort(key=lambda x: x[1])
-    mp4_files.sort(key=lambda x: x[1])
-
-    file_progress = tqdm(total=len(all_files), desc="Total Progress", unit="file", ncols=80, dynamic_ncols=True, position=0, leave=True)
-
-    # Process non-MP4 files first
-    for file_path, _ in non_mp4_files:
-        if is_game_running():
-            wait_for_game_exit()
-
-        filename = os.path.basename(file_path)
-        preset_name = get_preset_for_file(file_path, source_folder)
-        output_file = os.path.join(destination_folder, os.path.splitext(filename)[0] + ".mp4")
-        print(f"\nProcessing: {filename} - {preset_name}")
+    with slots_changed:
+        slot_state["free"] -= job["slots"]
+        slot_state["running"] += 1
+        slot_state["inputs"].add(job["input_file"])
+        job["position"] = slot_state["positions"].pop()
+    threading.Thread(target=run_encode_job, args=(job, source_folder, handbrakecli_path, slot_state, file_progress, skip_mode),
+                     daemon=True).start()
+    return True
 
-        if encode_video(file_path, output_file, preset_name, handbrakecli_path):
-            handle_file(file_path, output_file, source_folder)
-        else:
-            handle_encoding_error(file_path, source_folder)
+def wait_for_jobs(slot_state):
+    with slots_changed:
+        while slot_state["running"]:
+            slots_changed.wait(timeout=1)
+
+def print_queue_eta(source_folder, destination_folder):
+    """Estimate how long the current queue would take with all encode slots busy."""
+    jobs = build_jobs(source_folder, destination_folder)
+    slot_seconds = sum(job["est_seconds"] * job["slots"] for job in jobs)
+    eta = slot_seconds / ENCODE_SLOTS
+    finish = time.strftime("%a %H:%M", time.localtime(time.time() + eta))
+    print(f"\nQueue: {len(jobs)} files, {sum(job['size'] for job in jobs) / 1024 ** 3:.1f} GB, "
+          f"~{sum(job['est_saved'] for job in jobs) / 1024 ** 3:.1f} GB expected savings")
+    print(f"ETA with {ENCODE_SLOTS} slots: ~{encode_planner.format_duration(eta)} (done around {finish})")
+    for preset_key in PRESETS:
+        preset_jobs = [job for job in jobs if job["preset_key"] == preset_key]
+        if preset_jobs:
+            print(f"  {preset_key:>8}: {len(preset_jobs)} files, "
+                  f"~{encode_planner.format_duration(sum(job['est_seconds'] for job in preset_jobs))} of encoding")
+
+def process_folder(source_folder, destination_folder, handbrakecli_path,
+                   policy=encode_planner.DEFAULT_ORDER_POLICY, deadline=None, skip_mode=encode_planner.DEFAULT_SKIP_MODE):
+    os.makedirs(destination_folder, exist_ok=True)
 
-        file_progress.update(1)
+    jobs = build_jobs(source_folder, destination_folder)
+    if not jobs:
+        print("No files found to process.")
+        return False
 
-    # Process MP4 files next
-    for file_path, _ in mp4_files:
-        if is_game_running():
-            wait_for_game_exit()
+    jobs = skip_predicted(jobs, source_folder, skip_mode)
 
-        filename = os.path.basename(file_path)
-        preset_name = get_preset_for_file(file_path, source_folder)
-        output_file = os.path.join(destination_folder, filename)
-        print(f"\nProcessing: {filename} - {preset_name}")
+    # Non-MP4 files are queued first, then the policy decides the order within each group
+    queue = encode_planner.order_jobs(jobs, policy, deadline, ENCODE_SLOTS)
+    encode_planner.print_plan(queue, policy, len(jobs) - len(queue))
+    if not queue:
+        return False
 
-        if encode_video(file_path, output_file, preset_name, handbrakecli_path):
-            handle_file(file_path, output_file, source_folder)
-        else:
-            handle_encoding_error(file_path, source_folder)
+    file_progress = tqdm(total=len(queue), desc="Total Progress", unit="file", ncols=80, dynamic_ncols=True, position=0, leave=True)
+    slot_state = new_slot_state()
 
-        file_progress.update(1)
+    # Jobs start in queue order as soon as enough slots are free
+    for job in queue:
+        start_job(job, source_folder, handbrakecli_path, slot_state, file_progress, deadline, skip_mode)
+    wait_for_jobs(slot_state)
 
     file_progress.close()
-
-    # Clear reference to output file before entering wait loop
-    global current_output_file
-    current_output_file = None
+    probe_cache.print_stats()
 
     return True
 
-def main():
+def watch_folder(source_folder, destination_folder, handbrakecli_path,
+                 policy=encode_planner.DEFAULT_ORDER_POLICY, deadline=None, skip_mode=encode_planner.DEFAULT_SKIP_MODE):
+    """Encode files as they appear, keeping the queue in memory instead of re-walking the folder.
+
+    New files join the queue once they have stopped growing and the queue is re-ordered by the policy.
+    With a deadline, returns once it has passed and the running encodes are done."""
+    os.makedirs(destination_folder, exist_ok=True)
+    watcher = folder_watcher.FolderWatcher(source_folder, VIDEO_EXTENSIONS, EXCLUDED_DIRS)
+    print(f"Watching {source_folder} for new files ({watcher.mode})...")
+
+    pending = []
+    slot_state = new_slot_state()
+    file_progress = tqdm(total=0, desc="Total Progress", unit="file", ncols=80, dynamic_ncols=True, position=0, leave=True)
+    try:
+        while True:
+            with slots_changed:
+                can_start = bool(pending) and slot_state["free"] >= pending[0]["slots"]
+                running = slot_state["running"]
+            if deadline is not None and time.time() >= deadline and not running:
+                print("\nDeadline reached. Stopping watch mode.")
+                return True
+
+            ready, removed = watcher.poll(timeout=0 if can_start else 1)
+            if removed:
+                removed = set(removed)
+                kept = [job for job in pending if job["input_file"] not in removed]
+                file_progress.total -= len(pending) - len(kept)
+                pending = kept
+            if ready:
+                # A file rewritten while queued or encoding is reported ready again; it already has a job
+                with slots_changed:
+                    queued = {job["input_file"] for job in pending} | slot_state["inputs"]
+                ready = [(path, size) for path, size in ready if path not in queued]
+            if ready:
+                rates = encode_planner.get_rates()  # Includes whatever the encodes since the last batch taught us
+                jobs = skip_predicted([make_job(path, size, source_folder, destination_folder, rates) for path, size in ready],
+                                      source_folder, skip_mode)
+                pending = encode_planner.order_jobs(pending + jobs, policy)  # Deadline is checked as each job starts
+                file_progress.total += len(jobs)
+            if removed or ready:
+                file_progress.refresh()
+                continue  # Re-check the head of the re-ordered queue
+
+            if can_start:
+                start_job(pending.pop(0), source_folder, handbrakecli_path, slot_state, file_progress, deadline, skip_mode)
+    finally:
+        wait_for_jobs(slot_state)
+        watcher.close()
+        file_progress.close()
+        probe_cache.print_stats()
+
+def main(policy=encode_planner.DEFAULT_ORDER_POLICY, deadline=None, skip_mode=encode_planner.DEFAULT_SKIP_MODE,
+         game_action=DEFAULT_GAME_ACTION, watch=False):
     source_folder = input("Enter the source folder path: ")
     destination_folder = input("Enter the destination folder path: ")
     if not os.path.exists(source_folder):
@@ -294,12 +631,16 @@ def main():
         sys.exit(1)
 
     handbrakecli_path = find_handbrakecli()
+    start_game_throttle(game_action)
+
+    if watch:
+        return watch_folder(source_folder, destination_folder, handbrakecli_path, policy, deadline, skip_mode)
 
     while True:
         if is_game_running():
             wait_for_game_exit()
 
-        if not process_folder(source_folder, destination_folder, handbrakecli_path):
+        if not process_folder(source_folder, destination_folder, handbrakecli_path, policy, deadline, skip_mode):
             print("No new files found. Exiting.")
             return True
 
@@ -307,4 +648,24 @@ def main():
         time.sleep(60)  # Wait for 60 seconds before scanning the folder again
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Encode a folder of videos with HandBrakeCLI.")
+    parser.add_argument("--order", choices=encode_planner.ORDER_POLICIES, default=encode_planner.DEFAULT_ORDER_POLICY,
+                        help="queue order: size, shortest job first, bytes saved per hour, or deadline")
+    parser.add_argument("--deadline", help="HH:MM to be done by, e.g. the hibernation time; implies --order deadline")
+    parser.add_argument("--skip", choices=encode_planner.SKIP_MODES, default=encode_planner.DEFAULT_SKIP_MODE,
+                        help="skip files predicted not to shrink (once a preset's rates are learned from history); "
+                             "sample also test-encodes borderline files")
+    parser.add_argument("--game-action", choices=GAME_ACTIONS, default=DEFAULT_GAME_ACTION,
+                        help="while a game runs, suspend running encodes, lower their priority, or leave them alone")
+    parser.add_argument("--watch", action="store_true",
+                        help="keep running and encode new files as soon as they finish copying in")
+    parser.add_argument("--report", metavar="SOURCE_FOLDER", nargs="?", const="",
+                        help="print encode history (and the ETA of SOURCE_FOLDER's queue, if given) and exit")
+    args = parser.parse_args()
+    if args.report is not None:
+        encode_history.print_report()
+        if args.report:
+            print_queue_eta(args.report, args.report)
+        sys.exit(0)
+    deadline = encode_planner.parse_deadline(args.deadline) if args.deadline else None
+    main("deadline" if deadline is not None else args.order, deadline, args.skip, args.game_action, args.watch)
\ No newline at end of file
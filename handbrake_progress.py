@@ -0,0 +1,136 @@
+import re
+import json
+import time
+import argparse
+import threading
+
+# Configurable settings
+READ_CHUNK_SIZE = 64 * 1024  # Bytes of HandBrakeCLI output read at a time
+TELEMETRY_FILE = "encode_telemetry.jsonl"
+TELEMETRY_INTERVAL = 5  # Seconds between telemetry records per encode (pass changes are always written)
+MAX_TAIL = 4096  # An unterminated update longer than this is garbage, not a partial progress line
+
+# e.g. "Encoding: task 1 of 2, 12.34 % (45.67 fps, avg 50.12 fps, ETA 01h02m03s)"; the part in brackets
+# is missing for the first second or so of each pass
+PROGRESS_PATTERN = re.compile(
+    rb"Encoding: task (\d+) of (\d+), (\d+\.\d+) %"
+    rb"(?: \((\d+\.\d+) fps, avg (\d+\.\d+) fps, ETA (\d+)h(\d+)m(\d+)s\))?"
+)
+PROGRESS_MARKER = b"Encoding: task"
+LEGACY_PATTERN = r'Encoding: task \d+ of \d+, (\d+\.\d+) %'
+
+_telemetry_lock = threading.Lock()
+
+def make_event(match):
+    """Turn a progress match into {"pass", "passes", "percent", "overall", "fps", "avg_fps", "eta"}."""
+    task, tasks, percent, fps, avg_fps, hours, minutes, seconds = match.groups()
+    task, tasks, percent = int(task), int(tasks), float(percent)
+    return {
+        "pass": task,
+        "passes": tasks,
+        "percent": percent,
+        "overall": ((task - 1) * 100 + percent) / tasks,  # Progress across all passes, 0-100
+        "fps": float(fps) if fps else None,
+        "avg_fps": float(avg_fps) if avg_fps else None,
+        "eta": int(hours) * 3600 + int(minutes) * 60 + int(seconds) if hours else None,
+    }
+
+def find_last_event(data, end):
+    """Parse only the newest progress update in data[:end], found by scanning back for the marker."""
+    start = data.rfind(PROGRESS_MARKER, 0, end)
+    while start >= 0:
+        match = PROGRESS_PATTERN.match(data, start, end)
+        if match:
+            return make_event(match)
+        start = data.rfind(PROGRESS_MARKER, 0, start)
+    return None
+
+class ProgressParser:
+    """Incremental parser for HandBrakeCLI's stdout, fed raw byte chunks.
+
+    HandBrake rewrites its progress line with carriage returns, so updates are split on both
+    '\\r' and '\\n'; an update cut off at the end of a chunk is kept until the next one arrives.
+    Only the newest complete update in each chunk is parsed: the older ones are already stale.
+    """
+
+    def __init__(self):
+        self._tail = b""
+
+    def feed(self, chunk):
+        """Return the newest progress event completed by this chunk, or None."""
+        data = self._tail + chunk
+        end = max(data.rfind(b"\r"), data.rfind(b"\n")) + 1
+        self._tail = data[end:][-MAX_TAIL:]
+        return find_last_event(data, end)
+
+    def finish(self):
+        """Parse whatever is left once the output has ended."""
+        data, self._tail = self._tail, b""
+        return find_last_event(data, len(data))
+
+class TelemetryWriter:
+    """Appends one encode's progress events to the JSON-lines telemetry file, at most every interval seconds."""
+
+    def __init__(self, input_file, preset_name, path=TELEMETRY_FILE, interval=TELEMETRY_INTERVAL):
+        self.input_file = input_file
+        self.preset_name = preset_name
+        self.path = path
+        self.interval = interval
+        self._last_time = 0
+        self._last_pass = None
+
+    def write(self, event, force=False):
+        now = time.time()
+        if not force and event["pass"] == self._last_pass and now - self._last_time < self.interval:
+            return
+        self._last_time = now
+        self._last_pass = event["pass"]
+        record = {"time": now, "input_file": self.input_file, "preset": self.preset_name, **event}
+        with _telemetry_lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record) + "\n")
+
+def legacy_parse(text):
+    """The original approach: an uncompiled re.search on every line. Returns the last percentage."""
+    last = None
+    for line in text.splitlines():
+        match = re.search(LEGACY_PATTERN, line)
+        if match:
+            last = float(match.group(1))
+    return last
+
+def benchmark(log_paths, runs=5):
+    """Replay captured HandBrakeCLI output through the legacy and chunked parsers and compare them."""
+    logs = []
+    for path in log_paths:
+        with open(path, "rb") as f:
+            logs.append(f.read())
+    total_mb = sum(len(log) for log in logs) / 1024 ** 2
+
+    start = time.perf_counter()
+    for _ in range(runs):
+        for log in logs:
+            legacy_parse(log.decode("utf-8", errors="replace"))  # Text mode decoded the whole stream too
+    legacy = (time.perf_counter() - start) / runs
+
+    start = time.perf_counter()
+    for _ in range(runs):
+        events = 0
+        for log in logs:
+            parser = ProgressParser()
+            for offset in range(0, len(log), READ_CHUNK_SIZE):
+                events += parser.feed(log[offset:offset + READ_CHUNK_SIZE]) is not None
+            events += parser.finish() is not None
+    chunked = (time.perf_counter() - start) / runs
+
+    updates = sum(log.count(PROGRESS_MARKER) for log in logs)
+    print(f"{len(logs)} logs, {total_mb:.1f} MB, {updates} progress updates, {events} parsed by the chunked parser")
+    print(f"legacy line parser:  {legacy * 1000:8.1f} ms ({total_mb / legacy:8.1f} MB/s)")
+    print(f"chunked parser:      {chunked * 1000:8.1f} ms ({total_mb / chunked:8.1f} MB/s)")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark HandBrakeCLI progress parsing by replaying captured output logs.")
+    parser.add_argument("logs", nargs="+", help="captured HandBrakeCLI stdout, e.g. from handbrake.CAPTURE_LOG_FOLDER")
+    parser.add_argument("--runs", type=int, default=5, help="replays of each log per parser")
+    args = parser.parse_args()
+    benchmark(args.logs, args.runs)
@@ -1,7 +1,6 @@
 import requests
-import json
 import xml.etree.ElementTree as ET
-import os
+import work_journal  # Append-only journal behind files_to_process.json
 
 DOCKER_MOUNT_PATH = "/data/"
 WINDOWS_MOUNT_PATH = "Y:\\Media\\Plex Media\\"
@@ -49,17 +48,6 @@ def get_playlist_items(playlist_key):
         print("Failed to parse XML response from Plex.")
         return []
 
-def load_existing_data(output_file):
-    """Load existing data from the output file if it exists."""
-    if os.path.exists(output_file):
-        try:
-            with open(output_file, "r", encoding="utf-8") as f:
-                return json.load(f)
-        except json.JSONDecodeError:
-            print("[ERROR] JSON file is corrupt. Starting fresh.")
-            return {"encoder": "", "ignored_encoders": [], "files": []}
-    return {"encoder": "", "ignored_encoders": [], "files": []}
-
 def main():
     playlists = get_playlists()
     if not playlists:
@@ -79,15 +67,17 @@ def main():
     playlist_key = selected_playlist['ratingKey']
     items = get_playlist_items(playlist_key)
     
-    existing_data = load_existing_data(OUTPUT_FILE)
-    existing_files_set = {file_info["file"] for file_info in existing_data["files"]}
-    
+    journal = work_journal.WorkJournal(OUTPUT_FILE)
+    try:
+        journal.load()
+    except ValueError:
+        print("[ERROR] JSON file is corrupt. Starting fresh.")
+
     for item in items:
-        if item["file"] not in existing_files_set:
-            existing_data["files"].append(item)
-    
-    with open(OUTPUT_FILE, "w", encoding="utf-8") as f:
-        json.dump(existing_data, f, indent=4)
+        if item["file"] not in journal:
+            journal.add(item)
+
+    journal.close()
     
     print(f"Playlist information updated in {OUTPUT_FILE}")
 
@@ -0,0 +1,320 @@
+import os
+import time
+import shutil
+import struct
+import argparse
+
+# Configurable settings
+REWRITE_PADDING = 4096  # Free space left after moov when a file has to be rewritten, so the next edit fits in place
+COPY_BUFFER_SIZE = 16 * 1024 * 1024  # Read size for the streamed rewrite
+
+TOOL_TAG = b"\xa9too"
+CONTAINER_BOXES = {b"moov", b"trak", b"mdia", b"minf", b"stbl", b"udta", b"meta", b"ilst", b"edts", b"dinf"}
+PADDING_BOXES = {b"free", b"skip"}
+DATA_TYPE_UTF8 = 1
+META_HANDLER = b"\x00" * 8 + b"mdir" + b"appl" + b"\x00" * 9  # hdlr payload for iTunes-style metadata
+
+class Box:
+    """One MP4 box. Containers keep a list of child boxes, everything else its raw payload.
+
+    prefix holds the version/flags of an ISO 'meta' box, which sit before its children."""
+
+    def __init__(self, box_type, payload=b"", children=None, prefix=b""):
+        self.type = box_type
+        self.payload = payload
+        self.children = children
+        self.prefix = prefix
+
+    def find(self, box_type):
+        for child in self.children or ():
+            if child.type == box_type:
+                return child
+        return None
+
+    def serialize(self):
+        body = self.prefix + b"".join(child.serialize() for child in self.children) if self.children is not None else self.payload
+        if len(body) + 8 <= 0xFFFFFFFF:
+            return struct.pack(">I4s", len(body) + 8, self.type) + body
+        return struct.pack(">I4sQ", 1, self.type, len(body) + 16) + body
+
+def parse_header(header, remaining, offset):
+    """Return (type, header size, total size) from the first 16 bytes of a box, or raise ValueError.
+
+    remaining is how many bytes are left in the enclosing box (or file) from the start of this one."""
+    if len(header) < 8:
+        raise ValueError(f"Truncated box header at offset {offset}")
+    size, box_type = struct.unpack_from(">I4s", header)
+    header_size = 8
+    if size == 1:
+        if len(header) < 16:
+            raise ValueError(f"Truncated box header at offset {offset}")
+        size = struct.unpack_from(">Q", header, 8)[0]
+        header_size = 16
+    elif size == 0:
+        size = remaining  # Runs to the end of the file
+    if size < header_size or size > remaining:
+        raise ValueError(f"Box '{box_type.decode('latin-1')}' at offset {offset} has an invalid size")
+    return box_type, header_size, size
+
+def read_box_header(data, offset, end):
+    return parse_header(data[offset:offset + 16], end - offset, offset)
+
+def parse_boxes(data, offset=0, end=None, in_ilst=False):
+    """Parse the boxes in data[offset:end], descending into the containers that tag edits need.
+
+    Every item in an ilst (one per tag, named after it) is a container of data boxes."""
+    end = len(data) if end is None else end
+    boxes = []
+    while offset < end:
+        box_type, header, size = read_box_header(data, offset, end)
+        body_start, body_end = offset + header, offset + size
+        if in_ilst:
+            boxes.append(Box(box_type, children=parse_boxes(data, body_start, body_end)))
+        elif box_type in CONTAINER_BOXES:
+            prefix = b""
+            # ISO 'meta' is a full box (4 bytes of version/flags); QuickTime's starts straight with its children
+            if box_type == b"meta" and data[body_start + 4:body_start + 8] != b"hdlr":
+                prefix = data[body_start:body_start + 4]
+            boxes.append(Box(box_type, children=parse_boxes(data, body_start + len(prefix), body_end, box_type == b"ilst"),
+                             prefix=prefix))
+        else:
+            boxes.append(Box(box_type, payload=data[body_start:body_end]))
+        offset = body_end
+    return boxes
+
+def scan_top_level(f):
+    """List the top-level boxes of an open file as (type, offset, size) without reading their contents."""
+    f.seek(0, os.SEEK_END)
+    file_size = f.tell()
+    boxes = []
+    offset = 0
+    while offset < file_size:
+        f.seek(offset)
+        box_type, _, size = parse_header(f.read(16), file_size - offset, offset)
+        boxes.append((box_type, offset, size))
+        offset += size
+    return boxes
+
+def make_data_box(text):
+    return Box(b"data", payload=struct.pack(">II", DATA_TYPE_UTF8, 0) + text.encode("utf-8"))
+
+def set_ilst_text(moov, tag, text):
+    """Set a text tag in moov/udta/meta/ilst, creating whichever of those boxes is missing.
+
+    Padding boxes directly inside udta and meta are dropped; the caller accounts for the space."""
+    udta = moov.find(b"udta")
+    if udta is None:
+        udta = Box(b"udta", children=[])
+        moov.children.append(udta)
+    udta.children = [child for child in udta.children if child.type not in PADDING_BOXES]
+    meta = udta.find(b"meta")
+    if meta is None:
+        meta = Box(b"meta", children=[Box(b"hdlr", payload=META_HANDLER)], prefix=b"\x00" * 4)
+        udta.children.append(meta)
+    meta.children = [child for child in meta.children if child.type not in PADDING_BOXES]
+    ilst = meta.find(b"ilst")
+    if ilst is None:
+        ilst = Box(b"ilst", children=[])
+        meta.children.append(ilst)
+    item = Box(tag, children=[make_data_box(text)])
+    for i, child in enumerate(ilst.children):
+        if child.type == tag:
+            ilst.children[i] = item
+            break
+    else:
+        ilst.children.append(item)
+
+def get_ilst_text(moov, tag):
+    """Return a text tag from moov/udta/meta/ilst, or None."""
+    box = moov
+    for box_type in (b"udta", b"meta", b"ilst", tag, b"data"):
+        box = box.find(box_type) if box is not None else None
+    if box is None:
+        return None
+    return box.payload[8:].decode("utf-8", errors="replace")
+
+def shift_chunk_offsets(moov, moov_end, delta):
+    """Move every chunk offset that points past the old moov by delta bytes (stco and co64 tables)."""
+    for trak in (child for child in moov.children if child.type == b"trak"):
+        stbl = trak.find(b"mdia")
+        for box_type in (b"minf", b"stbl"):
+            stbl = stbl.find(box_type) if stbl is not None else None
+        if stbl is None:
+            continue
+        for table in stbl.children:
+            if table.type not in (b"stco", b"co64"):
+                continue
+            count = struct.unpack_from(">I", table.payload, 4)[0]
+            fmt = ">%d%s" % (count, "I" if table.type == b"stco" else "Q")
+            offsets = [offset + delta if offset >= moov_end else offset
+                       for offset in struct.unpack_from(fmt, table.payload, 8)]
+            if table.type == b"stco" and offsets and max(offsets) > 0xFFFFFFFF:
+                raise ValueError("Chunk offsets would overflow stco; the file needs co64")
+            table.payload = table.payload[:8] + struct.pack(fmt, *offsets)
+
+def free_box(size):
+    return struct.pack(">I4s", size, b"free") + b"\x00" * (size - 8)
+
+def read_moov(f, boxes):
+    moov_entries = [(offset, size) for box_type, offset, size in boxes if box_type == b"moov"]
+    if len(moov_entries) != 1:
+        raise ValueError(f"Expected one moov box, found {len(moov_entries)}")
+    offset, size = moov_entries[0]
+    f.seek(offset)
+    data = f.read(size)
+    moov = parse_boxes(data)[0]
+    return moov, offset, size
+
+def get_tag(path, tag=TOOL_TAG):
+    """Read a text tag such as the Tool tag from an MP4."""
+    with open(path, "rb") as f:
+        moov, _, _ = read_moov(f, scan_top_level(f))
+    return get_ilst_text(moov, tag)
+
+def set_tag(path, text, tag=TOOL_TAG):
+    """Write a text tag (the Tool tag by default) into an MP4.
+
+    Only moov is rebuilt. It is written back in place when moov is the last box, or when moov plus
+    the free boxes right after it have room for the new version (the rest becomes a free box); the
+    media data is never touched. Otherwise the file is streamed into a new copy with the chunk offsets
+    shifted and REWRITE_PADDING bytes of free space after moov. Returns "in-place" or "rewrite".
+    """
+    with open(path, "r+b") as f:
+        boxes = scan_top_level(f)
+        moov, moov_offset, moov_size = read_moov(f, boxes)
+        set_ilst_text(moov, tag, text)
+        new_moov = moov.serialize()
+
+        index = next(i for i, box in enumerate(boxes) if box[1] == moov_offset)
+        following = boxes[index + 1:]
+        region = moov_size
+        for box_type, _, size in following:
+            if box_type not in PADDING_BOXES:
+                break
+            region += size
+        is_last = all(box_type in PADDING_BOXES for box_type, _, _ in following)
+
+        slack = region - len(new_moov)
+        if is_last or slack == 0 or slack >= 8:
+            f.seek(moov_offset)
+            if is_last:
+                f.write(new_moov)
+                f.truncate()
+            else:
+                f.write(new_moov + (free_box(slack) if slack else b""))
+            f.flush()
+            os.fsync(f.fileno())
+            return "in-place"
+
+    rewrite_with_moov(path, moov, moov_offset, region)
+    return "rewrite"
+
+def rewrite_with_moov(path, moov, moov_offset, old_region):
+    """Stream the file into a temporary copy with a new moov plus padding, then swap it in.
+
+    old_region is the size of the old moov and any free boxes right after it, all of which are replaced."""
+    # Patching offsets doesn't change their width, so the shift is known before they are patched
+    new_size = len(moov.serialize())
+    shift_chunk_offsets(moov, moov_offset + old_region, new_size + REWRITE_PADDING - old_region)
+    new_moov = moov.serialize()  # Same length: patched offsets keep their width
+
+    temp_path = path + ".tagtmp"
+    try:
+        with open(path, "rb") as src, open(temp_path, "wb") as dst:
+            copy_range(src, dst, 0, moov_offset)
+            dst.write(new_moov + free_box(REWRITE_PADDING))
+            src.seek(0, os.SEEK_END)
+            copy_range(src, dst, moov_offset + old_region, src.tell() - moov_offset - old_region)
+            dst.flush()
+            os.fsync(dst.fileno())
+        shutil.copystat(path, temp_path)
+        os.replace(temp_path, path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+def copy_range(src, dst, offset, length):
+    src.seek(offset)
+    while length > 0:
+        chunk = src.read(min(COPY_BUFFER_SIZE, length))
+        if not chunk:
+            raise ValueError("File ended early while rewriting")
+        dst.write(chunk)
+        length -= len(chunk)
+
+def make_fixture(path, moov_first=True, padding=0, mdat_size=1024 * 1024, existing_tag=None):
+    """Write a minimal MP4 with one track whose chunk offsets point into mdat, for checking edits."""
+    chunk_count = 4
+    chunk_size = mdat_size // chunk_count
+    mdat_payload = bytes(range(256)) * (mdat_size // 256)
+
+    def build_moov(mdat_data_offset):
+        stco = Box(b"stco", payload=struct.pack(">II%dI" % chunk_count, 0, chunk_count,
+                                                *(mdat_data_offset + i * chunk_size for i in range(chunk_count))))
+        trak = Box(b"trak", children=[Box(b"tkhd", payload=b"\x00" * 84),
+                                      Box(b"mdia", children=[Box(b"minf", children=[Box(b"stbl", children=[stco])])])])
+        moov = Box(b"moov", children=[Box(b"mvhd", payload=b"\x00" * 100), trak])
+        if existing_tag is not None:
+            set_ilst_text(moov, TOOL_TAG, existing_tag)
+        return moov
+
+    ftyp = Box(b"ftyp", payload=b"isom\x00\x00\x02\x00isomiso2mp41").serialize()
+    mdat_header = 8
+    pad = free_box(padding) if padding else b""
+    if moov_first:
+        moov_len = len(build_moov(0).serialize())
+        moov = build_moov(len(ftyp) + moov_len + len(pad) + mdat_header).serialize()
+        data = ftyp + moov + pad + Box(b"mdat", payload=mdat_payload).serialize()
+    else:
+        moov = build_moov(len(ftyp) + mdat_header).serialize()
+        data = ftyp + Box(b"mdat", payload=mdat_payload).serialize() + moov + pad
+    with open(path, "wb") as f:
+        f.write(data)
+
+def chunks_intact(path):
+    """Check that every chunk offset still points at the data the fixture wrote there."""
+    with open(path, "rb") as f:
+        moov, _, _ = read_moov(f, scan_top_level(f))
+        stco = moov.find(b"trak").find(b"mdia").find(b"minf").find(b"stbl").find(b"stco")
+        count = struct.unpack_from(">I", stco.payload, 4)[0]
+        for offset in struct.unpack_from(">%dI" % count, stco.payload, 8):
+            f.seek(offset)
+            if f.read(4) != bytes(range(4)):
+                return False
+    return True
+
+def check_fixtures(folder, text="HandBrake 1.9.2 2025022300"):
+    """Tag generated fixtures of each layout and report the method used, the time taken and whether they survived."""
+    layouts = [
+        ("moov last", dict(moov_first=False)),
+        ("moov last, tagged", dict(moov_first=False, existing_tag="old tool")),
+        ("moov first + free", dict(moov_first=True, padding=1024)),
+        ("moov first, no free", dict(moov_first=True)),
+        ("moov first, tagged", dict(moov_first=True, existing_tag="a much longer previous tool text than the new one")),
+    ]
+    os.makedirs(folder, exist_ok=True)
+    print(f"{'layout':<22} {'method':<9} {'ms':>7} {'tag ok':>7} {'chunks ok':>10}")
+    for name, options in layouts:
+        path = os.path.join(folder, "fixture.mp4")
+        make_fixture(path, **options)
+        start = time.perf_counter()
+        method = set_tag(path, text)
+        elapsed = time.perf_counter() - start
+        print(f"{name:<22} {method:<9} {elapsed * 1000:>7.2f} {str(get_tag(path) == text):>7} {str(chunks_intact(path)):>10}")
+        os.remove(path)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Read or write the Tool tag of MP4 files in place.")
+    parser.add_argument("files", nargs="*", help="MP4 files to read (or tag, with --set)")
+    parser.add_argument("--set", metavar="TEXT", help="write TEXT as the Tool tag")
+    parser.add_argument("--check-fixtures", metavar="FOLDER", help="tag generated test files of each layout in FOLDER")
+    args = parser.parse_args()
+    if args.check_fixtures:
+        check_fixtures(args.check_fixtures)
+    for file_path in args.files:
+        if args.set is not None:
+            start = time.perf_counter()
+            method = set_tag(file_path, args.set)
+            print(f"{file_path}: tagged {method} in {(time.perf_counter() - start) * 1000:.1f} ms")
+        else:
+            print(f"{file_path}: {get_tag(file_path)}")
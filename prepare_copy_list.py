@@ -1,52 +1,179 @@
 import os
-import subprocess
 import re
 import json
+import queue
+import argparse
+import threading
+import time
 from tqdm import tqdm  # Progress bar support
+import probe_cache  # Shared on-disk ffprobe result cache
+import work_journal  # Append-only journal behind files_to_process.json
 
 OUTPUT_FILE = "files_to_process.json"
 BROKEN_FILE_OUTPUT = "broken_files.json"
+SNAPSHOT_FILE = "scan_snapshot.json"  # Directory/file index used to skip unchanged parts of the tree
 VIDEO_EXTENSIONS = ('.mp4', '.mkv', '.avi', '.mov', '.flv', '.wmv', '.webm', '.mpg')
-ENCODER_COMMAND = [
-    "ffprobe", "-v", "error",
-    "-show_entries", "format_tags=encoder",
-    "-of", "default=noprint_wrappers=1:nokey=1"
-]
-
-def get_video_encoder(file_path):
-    """Retrieve the encoder metadata using ffprobe."""
-    command = ENCODER_COMMAND + [file_path]
+VIDEO_FILE_PATTERN = re.compile(r'\.(mp4|mkv|avi|mov|flv|wmv|webm|mpg|m4v)$', re.IGNORECASE)
+DEFAULT_SCAN_JOBS = 8  # Number of concurrent ffprobe workers
+
+def get_media_record(file_path):
+    """Probe a file once and return its size plus the compact media summary, or None if it no longer exists."""
     try:
-        result = subprocess.run(command, capture_output=True, text=True, check=True)
-        return result.stdout.strip()
-    except subprocess.CalledProcessError as e:
-        print(f"Error retrieving encoder for {file_path}: {e}")
+        file_stat = os.stat(file_path)
+    except OSError:
         return None
 
-def scan_video_files(source_folder):
-    """Scan the given folder for video files and retrieve their encoders."""
-    encoders = set()
-    video_files = []
-    broken_files = []
-    file_encoder_map = {}
-    
-    for root, _, files in sorted(os.walk(source_folder), key=lambda x: x[0]):
+    summary = probe_cache.summarize(probe_cache.probe_file(file_path, file_stat))
+    if summary is None:
+        tqdm.write(f"Error retrieving metadata for {file_path}")
+        summary = {"encoder": None}
+    return {"size": file_stat.st_size, **summary}
+
+def walk_changed_files(source_folder, old_dirs, new_dirs, records):
+    """Walk the folder against the previous snapshot and yield only video files that are new or modified.
+
+    Directories whose mtime is unchanged are not listed again: their subdirectories, files and probe
+    records come straight from the snapshot. In changed directories, files whose size and mtime match
+    the snapshot keep their record. Files modified in place without touching the directory are only
+    picked up by a full re-scan.
+    """
+    pending = [source_folder]
+    while pending:
+        root = pending.pop()
+        try:
+            dir_mtime = os.stat(root).st_mtime_ns  # Stat before listing so changes during the listing are seen next run
+        except OSError:
+            continue
+
+        old_entry = old_dirs.get(root)
+        if old_entry and old_entry["mtime_ns"] == dir_mtime:
+            new_dirs[root] = old_entry
+            for name, file_entry in old_entry["files"].items():
+                file_path = os.path.join(root, name)
+                if file_entry["record"] is None:
+                    yield file_path
+                else:
+                    records[file_path] = file_entry["record"]
+            pending.extend(os.path.join(root, d) for d in reversed(old_entry["subdirs"]))
+            continue
+
         print(f"Scanning directory: {root}")
-        for file in tqdm(sorted(files), desc=f"Scanning {root}", unit="file", leave=False):
-            if re.search(r'\.(mp4|mkv|avi|mov|flv|wmv|webm|mpg|m4v)$', file, re.IGNORECASE):
-                file_path = os.path.join(root, file)
-                video_files.append(file_path)
-
-                encoder = get_video_encoder(file_path)
-                if encoder:
-                    encoder = encoder.strip()
-                    encoders.add(encoder)
-                    file_encoder_map[file_path] = encoder
+        old_files = old_entry["files"] if old_entry else {}
+        subdirs = []
+        files = {}
+        try:
+            with os.scandir(root) as it:
+                entries = sorted(it, key=lambda e: e.name)
+        except OSError as e:
+            print(f"Error listing {root}: {e}")
+            continue
+
+        for entry in entries:
+            if entry.is_dir():
+                subdirs.append(entry.name)
+            elif VIDEO_FILE_PATTERN.search(entry.name):
+                file_path = os.path.join(root, entry.name)
+                file_stat = entry.stat()
+                old_file = old_files.get(entry.name)
+                if (old_file and old_file["record"] is not None and old_file["size"] == file_stat.st_size
+                        and old_file["mtime_ns"] == file_stat.st_mtime_ns):
+                    records[file_path] = old_file["record"]
+                    files[entry.name] = old_file
                 else:
-                    file_size = os.path.getsize(file_path)
-                    broken_files.append({"file": file_path, "size": file_size})
+                    files[entry.name] = {"size": file_stat.st_size, "mtime_ns": file_stat.st_mtime_ns, "record": None}
+                    yield file_path
+
+        new_dirs[root] = {"mtime_ns": dir_mtime, "subdirs": subdirs, "files": files}
+        pending.extend(os.path.join(root, d) for d in reversed(subdirs))
+
+def probe_worker(work_queue, records, records_lock, pbar):
+    """Take file paths off the queue and probe them until a stop marker arrives."""
+    while (file_path := work_queue.get()) is not None:
+        try:
+            record = get_media_record(file_path)
+        except Exception as e:
+            tqdm.write(f"Error probing {file_path}: {e}")
+            record = {"size": 0, "encoder": None}
+        with records_lock:
+            records[file_path] = record
+            pbar.update(1)
+
+def probe_files(file_paths, jobs=DEFAULT_SCAN_JOBS, desc="Probing"):
+    """Probe every path from the iterable with a pool of ffprobe workers and return {path: record} sorted by path."""
+    jobs = max(1, jobs)
+    work_queue = queue.Queue(maxsize=jobs * 4)
+    records = {}
+    records_lock = threading.Lock()
+
+    with tqdm(desc=desc, unit="file") as pbar:
+        workers = [threading.Thread(target=probe_worker, args=(work_queue, records, records_lock, pbar), daemon=True)
+                   for _ in range(jobs)]
+        for worker in workers:
+            worker.start()
+        for file_path in file_paths:
+            work_queue.put(file_path)
+        for _ in range(jobs):
+            work_queue.put(None)  # One stop marker per worker
+        for worker in workers:
+            worker.join()
+
+    # Probes finish in any order, so return the records in sorted path order
+    return {file_path: records[file_path] for file_path in sorted(records)}
+
+def load_snapshot(snapshot_file):
+    """Load the directory snapshot from the previous scan, or an empty one."""
+    if os.path.exists(snapshot_file):
+        try:
+            with open(snapshot_file, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except json.JSONDecodeError:
+            print("[ERROR] Snapshot file is corrupt. Doing a full re-scan.")
+    return {"dirs": {}}
+
+def save_snapshot(snapshot, snapshot_file):
+    """Write the snapshot to a temp file and swap it in so an interrupted save never corrupts it."""
+    temp_file = snapshot_file + ".tmp"
+    try:
+        with open(temp_file, "w", encoding="utf-8") as f:
+            json.dump(snapshot, f)
+        os.replace(temp_file, snapshot_file)
+    except Exception as e:
+        print(f"Error saving snapshot file: {e}")
+
+def scan_video_files(source_folder, jobs=DEFAULT_SCAN_JOBS, snapshot=None):
+    """Scan the given folder for video files, probing only files that are new or changed since the snapshot.
 
-    return encoders, video_files, broken_files, file_encoder_map
+    The snapshot is updated in place for the scanned folder; entries for other folders are kept.
+    """
+    source_folder = os.path.normpath(source_folder)
+    if snapshot is None:
+        snapshot = {"dirs": {}}
+    old_dirs = snapshot["dirs"]
+    new_dirs = {}
+    records = {}
+
+    probed = probe_files(walk_changed_files(source_folder, old_dirs, new_dirs, records), jobs)
+    for file_path, record in probed.items():
+        if record is not None and record["encoder"] is not None:  # Failed probes stay unrecorded so the next scan retries them
+            new_dirs[os.path.dirname(file_path)]["files"][os.path.basename(file_path)]["record"] = record
+        records[file_path] = record
+    print(f"Re-used {len(records) - len(probed)} unchanged files, probed {len(probed)} new or modified files.")
+
+    prefix = os.path.join(source_folder, "")
+    snapshot["dirs"] = {path: entry for path, entry in old_dirs.items()
+                        if path != source_folder and not path.startswith(prefix)}
+    snapshot["dirs"].update(new_dirs)
+
+    return {file_path: records[file_path] for file_path in sorted(records)}
+
+def is_broken(record):
+    """A file is broken if it exists but ffprobe could not read an encoder from it."""
+    return record is not None and not record["encoder"]
+
+def make_file_entry(file_path, record):
+    """Build a work-list entry carrying the probed metadata so later runs can filter without re-probing."""
+    media = {key: value for key, value in record.items() if key != "size"}
+    return {"file": file_path, "size": record["size"], "media": media}
 
 def load_existing_data(output_file):
     """Load existing data from the output file if it exists."""
@@ -67,55 +194,72 @@ def save_json(data, json_file):
     except Exception as e:
         print(f"Error saving JSON file: {e}")
 
-def filter_files(video_files, broken_files, file_encoder_map, selected_encoder, ignored_encoders):
-    """Filter files that need processing based on encoder and file type."""
+def filter_files(records, broken_files, selected_encoder, ignored_encoders, show_progress=True):
+    """Filter probed files that need processing based on encoder and file type.
+
+    Broken files and ignored encoders are looked up in sets, so filtering is linear in the number of records.
+    """
+    broken_set = {bf["file"] for bf in broken_files}
+    ignored_set = set(ignored_encoders)
     files_to_process = []
 
-    for file in tqdm(video_files, desc="Filtering", unit="file"):
-        if file in [bf["file"] for bf in broken_files]:
-            continue  # Skip broken files
-        
-        file_extension = os.path.splitext(file)[1]
-        file_encoder = file_encoder_map.get(file)
+    for file, record in tqdm(records.items(), desc="Filtering", unit="file", disable=not show_progress):
+        if record is None or file in broken_set:
+            continue  # Skip missing and broken files
 
-        if file_encoder in ignored_encoders:
+        file_encoder = record["encoder"]
+        if file_encoder in ignored_set:
             continue  # Skip files with ignored encoders
 
-        if file_extension == ".mp4":
-            if file_encoder and file_encoder != selected_encoder:
-                file_size = os.path.getsize(file)  # Get file size in bytes
-                files_to_process.append({"file": file, "size": file_size})
-        else:
-            file_size = os.path.getsize(file)
-            files_to_process.append({"file": file, "size": file_size})
+        if not file.endswith(".mp4") or (file_encoder and file_encoder != selected_encoder):
+            files_to_process.append(make_file_entry(file, record))
 
     return files_to_process
 
-def filter_existing_files(existing_files, file_encoder_map, selected_encoder, ignored_encoders):
-    """Filter existing files to ensure they still qualify for being in the list."""
+def filter_existing_files(existing_files, records, selected_encoder, ignored_encoders):
+    """Filter existing files against their probed records to ensure they still qualify for being in the list."""
+    ignored_set = set(ignored_encoders)
     valid_files = []
     removed_files_count = 0
     for file_info in tqdm(existing_files, desc="Filtering existing files", unit="file"):
         file_path = file_info["file"]
-        file_extension = os.path.splitext(file_path)[1]
-        file_encoder = get_video_encoder(file_path)  # Recheck encoder
+        record = records.get(file_path)
+
+        if record is None:
+            removed_files_count += 1
+            continue  # File no longer exists
 
-        if file_encoder in ignored_encoders:
+        file_encoder = record["encoder"]
+        if file_encoder in ignored_set:
             removed_files_count += 1
             continue  # Skip files with ignored encoders
 
-        if os.path.exists(file_path):
-            if file_extension == ".mp4":
-                if file_encoder and file_encoder != selected_encoder:
-                    valid_files.append(file_info)
-                else:
-                    removed_files_count += 1
-            else:
-                valid_files.append(file_info)
-        else:
+        if file_path.endswith(".mp4") and not (file_encoder and file_encoder != selected_encoder):
             removed_files_count += 1
+        else:
+            valid_files.append(make_file_entry(file_path, record))
     return valid_files, removed_files_count
 
+def benchmark_filter_files(sizes=(10_000, 100_000, 1_000_000)):
+    """Time filter_files on synthetic libraries to show it scales linearly with the number of entries."""
+    encoders = [f"Lavf58.{i}" for i in range(10)]
+    print(f"{'entries':>10} {'broken':>8} {'seconds':>9} {'ns/entry':>9}")
+    for size in sizes:
+        records = {}
+        broken_files = []
+        for i in range(size):
+            file_path = f"E:\\Media\\Show {i // 1000}\\Episode {i}.{'mp4' if i % 3 else 'mkv'}"
+            if i % 20 == 0:
+                records[file_path] = {"size": i, "encoder": None}
+                broken_files.append({"file": file_path, "size": i})
+            else:
+                records[file_path] = {"size": i, "encoder": encoders[i % len(encoders)]}
+
+        start = time.perf_counter()
+        filter_files(records, broken_files, encoders[0], encoders[1:3], show_progress=False)
+        elapsed = time.perf_counter() - start
+        print(f"{size:>10} {len(broken_files):>8} {elapsed:>9.3f} {elapsed / size * 1e9:>9.0f}")
+
 def get_encoder_choice(encoders):
     """Prompt the user to select an encoder from the list."""
     if not encoders:
@@ -133,26 +277,18 @@ def get_encoder_choice(encoders):
         else:
             print("Invalid choice. Please try again.")
 
-def main():
-    existing_data = load_existing_data(OUTPUT_FILE)
+def main(jobs=DEFAULT_SCAN_JOBS, full_rescan=False):
+    journal = work_journal.WorkJournal(OUTPUT_FILE)
+    try:
+        journal.load()
+    except ValueError:
+        print("[ERROR] JSON file is corrupt. Starting fresh.")
     broken_data = load_existing_data(BROKEN_FILE_OUTPUT)
-    
-    ignored_encoders = existing_data.get("ignored_encoders", [])
 
-    if existing_data["encoder"]:
-        selected_encoder = existing_data["encoder"]
+    ignored_encoders = journal.header.get("ignored_encoders", [])
+    selected_encoder = journal.header["encoder"]
+    if selected_encoder:
         print(f"Using existing encoder from file: {selected_encoder}")
-        video_files = [file_info["file"] for file_info in existing_data["files"]]
-        broken_files = broken_data["files"]
-        file_encoder_map = {file_info["file"]: selected_encoder for file_info in existing_data["files"]}
-        existing_data["files"], removed_files_count = filter_existing_files(existing_data["files"], file_encoder_map, selected_encoder, ignored_encoders)
-        print(f"Removed {removed_files_count} files from existing JSON.")
-        
-        # Flush updated JSON to disk
-        save_json(existing_data, OUTPUT_FILE)
-    else:
-        selected_encoder = ""
-        video_files, broken_files, file_encoder_map = [], [], {}
 
     source_folder = input("Enter the path to the folder containing video files: ").strip()
     if not os.path.isdir(source_folder):
@@ -160,35 +296,50 @@ def main():
         return
 
     print("Scanning for video files...")
+    snapshot = {"dirs": {}} if full_rescan else load_snapshot(SNAPSHOT_FILE)
+    new_records = scan_video_files(source_folder, jobs, snapshot)
+    save_snapshot(snapshot, SNAPSHOT_FILE)
+    encoders = {record["encoder"] for record in new_records.values() if record and record["encoder"]}
 
-    encoders, new_video_files, new_broken_files, new_file_encoder_map = scan_video_files(source_folder)
-    video_files.extend(new_video_files)
-    broken_files.extend(new_broken_files)
-    file_encoder_map.update(new_file_encoder_map)
+    # Entries already in the JSON but outside the scanned folder still need their one probe
+    records = dict(new_records)
+    existing_paths = [file_path for file_path in journal.entries if file_path not in records]
+    records.update(probe_files(existing_paths, jobs, desc="Probing existing files"))
 
-    if not selected_encoder:
+    new_broken_files = [{"file": file, "size": record["size"]} for file, record in new_records.items() if is_broken(record)]
+    if selected_encoder:
+        valid_files, removed_files_count = filter_existing_files(journal.files, records, selected_encoder, ignored_encoders)
+        valid_set = {file_info["file"] for file_info in valid_files}
+        for file_path in [file_path for file_path in journal.entries if file_path not in valid_set]:
+            journal.remove(file_path)
+        for file_info in valid_files:
+            if journal.get(file_info["file"]) != file_info:
+                journal.add(file_info)  # Refresh size and media metadata
+        print(f"Removed {removed_files_count} files from existing JSON.")
+        broken_files = [bf for bf in broken_data["files"] if bf["file"] not in new_records] + new_broken_files
+    else:
+        broken_files = new_broken_files
         if encoders:
-            selected_encoder = get_encoder_choice(encoders)
+            selected_encoder = get_encoder_choice(sorted(encoders))
         else:
             print("No encoders found. Exiting.")
             return
 
     print(f"Filtering files using encoder: {selected_encoder}")
-    files_to_process = filter_files(video_files, broken_files, file_encoder_map, selected_encoder, ignored_encoders)
+    files_to_process = filter_files(records, broken_files, selected_encoder, ignored_encoders)
 
-    existing_data["encoder"] = selected_encoder
+    journal.set("encoder", selected_encoder)
 
     # Add new files to the list if they are not already present
-    existing_files_set = {file_info["file"] for file_info in existing_data["files"]}
     skipped_files_count = 0
     for file_info in files_to_process:
-        if file_info["file"] not in existing_files_set:
-            existing_data["files"].append(file_info)
+        if file_info["file"] not in journal:
+            journal.add(file_info)
         else:
             skipped_files_count += 1
 
     # Save valid files to process
-    save_json(existing_data, OUTPUT_FILE)
+    journal.close()
 
     # Save broken files with the correct schema
     broken_data["files"] = broken_files
@@ -197,7 +348,16 @@ def main():
     print(f"List of {len(files_to_process)} files to process saved to {OUTPUT_FILE}")
     print(f"List of {len(broken_files)} broken files saved to {BROKEN_FILE_OUTPUT}")
     print(f"Skipped {skipped_files_count} files that were already in the JSON.")
+    probe_cache.print_stats()
     print("Processing complete.")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Build the list of video files that need processing.")
+    parser.add_argument("--jobs", type=int, default=DEFAULT_SCAN_JOBS, help="number of concurrent ffprobe workers")
+    parser.add_argument("--full-rescan", action="store_true", help="ignore the directory snapshot and re-list every folder")
+    parser.add_argument("--benchmark", action="store_true", help="time the filtering stage on synthetic entries and exit")
+    args = parser.parse_args()
+    if args.benchmark:
+        benchmark_filter_files()
+    else:
+        main(jobs=args.jobs, full_rescan=args.full_rescan)
\ No newline at end of file
@@ -0,0 +1,137 @@
+import os
+import json
+import subprocess
+import sqlite_store  # The cache is a SQLite file shared by the probing threads
+
+# Configurable settings
+PROBE_CACHE_FILE = "ffprobe_cache.db"
+PROBE_COMMAND = [
+    "ffprobe", "-v", "error",
+    "-print_format", "json",
+    "-show_format", "-show_streams"
+]
+COMMIT_EVERY = 100  # Commit pending cache writes after this many new probes
+
+_db = sqlite_store.Database(PROBE_CACHE_FILE, [
+    "CREATE TABLE IF NOT EXISTS probes (path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, inode INTEGER, data TEXT)"
+])
+_pending_writes = 0
+stats = {"hits": 0, "misses": 0}
+
+def close():
+    """Flush pending writes and close the cache database."""
+    global _pending_writes
+    with _db.lock:
+        _db.close()
+        _pending_writes = 0
+
+def run_ffprobe(file_path):
+    """Run ffprobe on a file and return the parsed JSON, or None if the file can't be probed."""
+    try:
+        result = subprocess.run(PROBE_COMMAND + [file_path], capture_output=True, text=True,
+                                encoding="utf-8", errors="replace", check=True)
+        return json.loads(result.stdout)
+    except subprocess.CalledProcessError:
+        return None
+    except json.JSONDecodeError:
+        return None
+
+def probe_file(file_path, file_stat=None):
+    """Return the ffprobe format/streams JSON for a file, re-probing only if it changed since the last run.
+
+    Failed probes are not cached: a locked file or a network hiccup would otherwise make the file
+    unreadable until it changed, so they are retried on the next call."""
+    global _pending_writes
+    try:
+        st = file_stat or os.stat(file_path)
+    except OSError:
+        return None
+
+    inode = st.st_ino or None  # st_ino is 0 on some Windows filesystems
+    with _db.lock:
+        row = _db.connect().execute(
+            "SELECT size, mtime_ns, inode, data FROM probes WHERE path = ?", (file_path,)
+        ).fetchone()
+        cached = row and row[0] == st.st_size and row[1] == st.st_mtime_ns and (row[2] is None or inode is None or row[2] == inode)
+        stats["hits" if cached else "misses"] += 1
+    if cached:
+        return json.loads(row[3])
+
+    info = run_ffprobe(file_path)
+    if info is None:
+        return None
+    data = json.dumps(info)
+    with _db.lock:
+        connection = _db.connect()
+        connection.execute(
+            "INSERT OR REPLACE INTO probes (path, size, mtime_ns, inode, data) VALUES (?, ?, ?, ?, ?)",
+            (file_path, st.st_size, st.st_mtime_ns, inode, data)
+        )
+        _pending_writes += 1
+        if _pending_writes >= COMMIT_EVERY:
+            connection.commit()
+            _pending_writes = 0
+    return info
+
+def get_tag(tags, name):
+    """Look up a metadata tag case-insensitively (MKV writes ENCODER, MP4 writes encoder)."""
+    if not tags:
+        return None
+    name = name.lower()
+    for key, value in tags.items():
+        if key.lower() == name:
+            return value
+    return None
+
+def get_streams(info, codec_type):
+    """Return all streams of the given type ('video', 'audio', ...) from a probe result."""
+    if not info:
+        return []
+    return [stream for stream in info.get("streams", []) if stream.get("codec_type") == codec_type]
+
+def _to_number(value, cast):
+    """Convert an ffprobe string field to a number, or None if it is missing or 'N/A'."""
+    try:
+        return cast(value)
+    except (TypeError, ValueError):
+        return None
+
+def _parse_rate(value):
+    """Parse an ffprobe rate such as '24000/1001' into frames per second."""
+    if not value or "/" not in value:
+        return _to_number(value, float)
+    numerator, denominator = value.split("/", 1)
+    numerator, denominator = _to_number(numerator, float), _to_number(denominator, float)
+    if not numerator or not denominator:
+        return None
+    return numerator / denominator
+
+def summarize(info):
+    """Reduce a full probe result to the compact set of fields the scripts filter on."""
+    if info is None:
+        return None
+    fmt = info.get("format", {})
+    video_streams = get_streams(info, "video")
+    audio_streams = get_streams(info, "audio")
+    video = video_streams[0] if video_streams else {}
+    return {
+        "encoder": (get_tag(fmt.get("tags"), "encoder") or "").strip(),
+        "video_codec": video.get("codec_name"),
+        "width": video.get("width"),
+        "height": video.get("height"),
+        "frame_rate": _parse_rate(video.get("avg_frame_rate")),
+        "duration": _to_number(fmt.get("duration"), float),
+        "bit_rate": _to_number(fmt.get("bit_rate"), int),
+        "video_streams": len(video_streams),
+        "audio_streams": len(audio_streams),
+        "audio_codecs": [stream.get("codec_name") for stream in audio_streams],
+        "audio_languages": sorted({get_tag(stream.get("tags"), "language") or "und" for stream in audio_streams}),
+    }
+
+def print_stats():
+    """Print the cache hit/miss counters for this run."""
+    total = stats["hits"] + stats["misses"]
+    if total == 0:
+        return
+    print(f"ffprobe cache: {stats['hits']} hits, {stats['misses']} misses "
+          f"({stats['hits'] / total * 100:.1f}% hit rate)")
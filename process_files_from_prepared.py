@@ -1,5 +1,5 @@
 import os
-import json
+import errno
 import shutil
 import tkinter as tk
 from tkinter import filedialog
@@ -7,6 +7,11 @@ from tqdm import tqdm  # Add tqdm for progress bar
 import logging
 import sys
 import send2trash  # Add send2trash for sending files to recycle bin
+import work_journal  # Append-only journal behind the JSON work lists
+import argparse
+import copy_engine  # Kernel-side file copies with a readinto fallback
+import copy_scheduler  # Per-drive concurrent transfer workers
+import space_packing  # Chooses which files fit into the free space
 
 # Configurable settings
 LOG_FILE = 'process_errors.log'
@@ -14,10 +19,20 @@ EXTRA_SPACE_REQUIRED = 500 * 1024 * 1024  # 500MB
 RETAG_THRESHOLD = 500 * 1024 * 1024  # 500MB
 CHECK_FOLDER = 'Y:\\Media\\Plex Media\\Handbrake Output'
 NON_ENGLISHJSON = 'non_english_audio.json'
+HASH_COPIES = True  # Hash data inline while copying; the journal keeps it so later runs can check existing copies
+# With HASH_COPIES on, interrupted copies keep their partial destination and resume from the last verified offset.
+# Off, copies use the kernel copy engine (copy_file_range, CopyFileExW) and moves are checked by size only.
+# Hashing is CPU bound: without the xxhash package (blake2b) it copies at ~300 MB/s, 8x slower than the kernel
+# copy on a fast SSD; run copy_engine.py on the real drives and turn it off if they outrun the hash
+VERIFY_COPIES = False  # Also read every copy back and compare it with the inline hash (doubles destination I/O)
+PARTIAL_SUFFIX = ".part"  # Copies are written as movie.mkv.part and renamed once complete, so handbrake.py never sees a partial
 DEFAULT_SOURCE_DIR = 'E:\\'
 DEFAULT_JSON_DIR = 'G:\\Users\\Johnny\\Downloads\\Programming'
 DEFAULT_JSON_FILE = 'files_to_process.json'
 
+folder_index = {}  # Destination folder -> set of normcased names, from one scandir per folder
+index_stats = {"listings": 0, "lookups": 0}
+
 # Setup logging
 logging.basicConfig(filename=LOG_FILE, level=logging.ERROR, format='%(asctime)s - %(levelname)s - %(message)s')
 
@@ -33,107 +48,228 @@ def get_free_space(folder):
         logging.error(f"Permission denied: {folder}")
         return 0
 
-def save_json(file_list_path, data):
-    """Save the updated file list back to JSON to keep progress consistent."""
+def get_folder_index(folder, refresh=False):
+    """Return the set of entry names in folder, listing it with one scandir the first time it is asked for."""
+    key = os.path.normcase(os.path.abspath(folder))
+    if refresh or key not in folder_index:
+        try:
+            with os.scandir(folder) as it:
+                folder_index[key] = {os.path.normcase(entry.name) for entry in it}
+        except FileNotFoundError:
+            folder_index[key] = set()
+        except OSError as e:
+            logging.error(f"Error listing {folder}: {e}")
+            folder_index[key] = set()
+        index_stats["listings"] += 1
+    return folder_index[key]
+
+def exists_in_folder(folder, file_name, refresh=False):
+    """Existence check against the folder's name index instead of a stat over the network."""
+    index_stats["lookups"] += 1
+    return os.path.normcase(file_name) in get_folder_index(folder, refresh)
+
+def destination_exists(path, refresh=False):
+    return exists_in_folder(os.path.dirname(path), os.path.basename(path), refresh)
+
+def print_index_stats():
+    """Report how many per-file stat calls the folder indexes replaced."""
+    avoided = index_stats["lookups"] - index_stats["listings"]
+    if index_stats["lookups"]:
+        print(f"Existence checks: {index_stats['lookups']} lookups from {index_stats['listings']} folder listings "
+              f"({max(avoided, 0)} stat calls avoided)")
+
+def load_journal(file_list_path):
+    """Open the work list through its journal, or return None (after logging) if it can't be read."""
+    if not os.path.exists(file_list_path) and not os.path.exists(file_list_path + work_journal.JOURNAL_SUFFIX):
+        logging.error(f"Error loading JSON file: file not found: {file_list_path}")
+        return None
     try:
-        with open(file_list_path, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=4)
-    except FileNotFoundError:
-        logging.error(f"File not found: {file_list_path}")
-    except PermissionError:
-        logging.error(f"Permission denied: {file_list_path}")
-    except Exception as e:
-        logging.error(f"Error updating JSON file: {e}")
+        return work_journal.WorkJournal(file_list_path).load()
+    except (ValueError, OSError) as e:
+        logging.error(f"Error loading JSON file: {e}")
+        return None
+
+def partial_path(dest_path):
+    """The name a copy into dest_path is written under until it is complete."""
+    return dest_path + PARTIAL_SUFFIX
 
-def delete_partial_file(file_path):
-    """Send the file to the recycle bin if it exists and is not fully copied."""
+def has_resume_point(dest_path):
+    """True if an interrupted copy into dest_path left a sidecar to resume from."""
+    return destination_exists(copy_engine.resume_sidecar_path(partial_path(dest_path)))
+
+def trash_file(file_path, description):
+    """Send a file to the recycle bin if it exists, logging instead of raising on failure."""
     if os.path.exists(file_path):
         try:
-            print(f"Sending partial file to recycle bin: {file_path}")
+            print(f"Sending {description} to recycle bin: {file_path}")
             send2trash.send2trash(file_path)
         except FileNotFoundError:
             logging.error(f"File not found: {file_path}")
         except PermissionError:
             logging.error(f"Permission denied: {file_path}")
         except Exception as e:
-            logging.error(f"Error sending partial file {file_path} to recycle bin: {e}")
-
-def copy_file_with_progress(src, dst):
-    """Copy a file and show a progress bar for the current file copy."""
+            logging.error(f"Error sending {description} {file_path} to recycle bin: {e}")
+
+def delete_partial_file(dest_path):
+    """Send the partial copy for dest_path to the recycle bin and forget its resume point."""
+    part = partial_path(dest_path)
+    copy_engine.discard_resume_state(part)
+    trash_file(part, "partial file")
+
+def verify_copy(dst, expected_hash):
+    """Hash the destination and compare it with the hash taken while copying."""
+    copy_engine.fsync_file(dst)
+    actual_hash = copy_engine.hash_file(dst)
+    if actual_hash != expected_hash:
+        raise copy_engine.VerificationError(f"checksum mismatch after copy ({actual_hash} != {expected_hash})")
+
+def copy_to_partial(src, part, progress):
+    """Copy src into part, hashed and resumable with HASH_COPIES. Returns the data hash, or None."""
+    if HASH_COPIES:
+        return copy_engine.copy_file_resumable(src, part, progress=progress)
+    copy_engine.copy_file(src, part, progress=progress)
+    return None
+
+def finish_copy(part, dst, total_size, source_hash):
+    """Flush and check a completed partial copy, then rename it to its final name."""
+    if source_hash and VERIFY_COPIES:
+        verify_copy(part, source_hash)
+    else:
+        copy_engine.fsync_file(part)
+        copied_size = os.path.getsize(part)
+        if copied_size != total_size:
+            raise copy_engine.VerificationError(f"size mismatch after copy ({copied_size} of {total_size} bytes)")
+    os.replace(part, dst)
+
+def bar_progress(pbar):
+    """Adapt a per-file bar to the scheduler's progress(count, transferred=True) callback."""
+    return lambda count, transferred=True: pbar.update(count)
+
+def copy_file_with_progress(src, dst, progress=None):
+    """Copy a file and show a progress bar for the current file copy. Returns the data hash when hashing.
+
+    The data goes to the partial name first and only takes dst's name once it is complete and checked.
+    If progress is given (e.g. a shared bar's update), it is used instead of a per-file bar.
+    Errors are logged and re-raised so the caller keeps the entry in the work list.
+    """
     try:
         total_size = os.path.getsize(src)
-        with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
-            with tqdm(total=total_size, unit='B', unit_scale=True, desc=f"Copying {os.path.basename(src)}") as pbar:
-                while (chunk := fsrc.read(1024 * 1024)):  # 1MB chunks
-                    fdst.write(chunk)
-                    pbar.update(len(chunk))
+        with tqdm(total=total_size, unit='B', unit_scale=True, desc=f"Copying {os.path.basename(src)}",
+                  disable=progress is not None) as pbar:
+            update = progress or bar_progress(pbar)
+            source_hash = copy_to_partial(src, partial_path(dst), update)
+        finish_copy(partial_path(dst), dst, total_size, source_hash)
+        return source_hash
     except FileNotFoundError:
         logging.error(f"File not found: {src} or {dst}")
+        raise
     except PermissionError:
         logging.error(f"Permission denied: {src} or {dst}")
+        raise
     except Exception as e:
         logging.error(f"Error copying file from {src} to {dst}: {e}")
+        raise
+
+def move_file_with_progress(src, dst, progress=None):
+    """Move a file and show a progress bar for the current file move. Returns the data hash if it was copied.
 
-def move_file_with_progress(src, dst):
-    """Move a file and show a progress bar for the current file move."""
+    Moves within one volume are a single atomic rename. Across volumes the file is copied to the partial
+    name, flushed to disk, verified (read back against the hash with VERIFY_COPIES, otherwise by size)
+    and renamed to dst before the source is deleted. If progress is given it replaces the per-file bar. Errors are logged and
+    re-raised so the caller can clean up the partial destination and keep the entry in the work list.
+    """
     try:
         total_size = os.path.getsize(src)
-        with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
-            with tqdm(total=total_size, unit='B', unit_scale=True, desc=f"Moving {os.path.basename(src)}") as pbar:
-                while (chunk := fsrc.read(1024 * 1024)):  # 1MB chunks
-                    fdst.write(chunk)
-                    pbar.update(len(chunk))
+        with tqdm(total=total_size, unit='B', unit_scale=True, desc=f"Moving {os.path.basename(src)}",
+                  disable=progress is not None) as pbar:
+            update = progress or bar_progress(pbar)
+            if copy_engine.same_device(src, dst):
+                try:
+                    # Report first so a cancelled scheduler never sees a finished rename fail; nothing is
+                    # transferred, so it isn't charged to the bandwidth limit
+                    update(total_size, transferred=False)
+                    os.replace(src, dst)
+                    return None
+                except OSError as e:
+                    if e.errno != errno.EXDEV:
+                        raise  # Anything but "different device" is a real failure
+
+            source_hash = copy_to_partial(src, partial_path(dst), update)
+        finish_copy(partial_path(dst), dst, total_size, source_hash)
         os.remove(src)
+        return source_hash
     except FileNotFoundError:
         logging.error(f"File not found: {src} or {dst}")
+        raise
     except PermissionError:
         logging.error(f"Permission denied: {src} or {dst}")
+        raise
     except Exception as e:
         logging.error(f"Error moving file from {src} to {dst}: {e}")
-
-def remove_existing_files(file_list_path, check_folder=CHECK_FOLDER):
-    """Remove files from the JSON list if they already exist in the check_folder."""
+        raise
+
+def existing_copy_state(file_entry, dest_path, recorded_hash):
+    """Decide what to do with a destination left by an earlier run, without reading its data.
+
+    Returns "copied" to treat it as already copied, "recopy" if its size proves it differs from the
+    recorded hash, or "hash" if the sizes match and the transfer has to compare the recorded hash.
+    File names aren't unique across the list, so without a recorded hash an existing destination may
+    be another entry's finished copy; it is treated as already copied, like before hashes existed.
+    """
+    recorded_hash = recorded_hash or ""
+    if not HASH_COPIES or not recorded_hash.startswith(copy_engine.HASH_ALGORITHM + ":"):
+        return "copied"
     try:
-        with open(file_list_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-    except (json.JSONDecodeError, FileNotFoundError) as e:
-        logging.error(f"Error loading JSON file: {e}")
-        return
-
-    files_to_check = data.get("files", [])
-    if not isinstance(files_to_check, list):
-        logging.error("Invalid format: 'files' should be a list.")
-        return
-
-    updated_files = []
-    for file_entry in files_to_check:
-        file_name = os.path.basename(file_entry["file"])
-        check_path = os.path.join(check_folder, file_name)
-        if not os.path.exists(check_path):
-            updated_files.append(file_entry)
-
-    data["files"] = updated_files
-    save_json(file_list_path, data)
+        if os.path.getsize(dest_path) != file_entry["size"]:
+            return "recopy"
+    except OSError:
+        return "copied"  # Can't be read to prove it differs
+    return "hash"
+
+def remove_existing_files(journal, check_folder=CHECK_FOLDER):
+    """Remove files from the work list if they already exist in the check_folder."""
+    for file_entry in journal.files:
+        if exists_in_folder(check_folder, os.path.basename(file_entry["file"])):
+            journal.remove(file_entry["file"])
+
+def transfer_file(task, progress):
+    """Copy or move one scheduled work-list entry, keeping the data hash on the task.
+
+    If the task carries a recorded hash, the existing destination is hashed first (with progress, on
+    the worker) and only replaced when it doesn't match.
+    """
+    if task["check_hash"]:
+        if copy_engine.hash_file(task["dst"], progress=progress) == task["check_hash"]:
+            tqdm.write(f"Existing copy matches its recorded hash (treating as copied): {os.path.basename(task['dst'])}")
+            delete_partial_file(task["dst"])  # A stale partial of a file that is already there
+            task["hash"] = task["check_hash"]
+            return
+        tqdm.write(f"Existing copy doesn't match its recorded hash, copying again: {os.path.basename(task['dst'])}")
+        trash_file(task["dst"], "mismatched copy")
+
+    if task["move"]:
+        task["hash"] = move_file_with_progress(task["src"], task["dst"], progress)
+    else:
+        task["hash"] = copy_file_with_progress(task["src"], task["dst"], progress)
 
-def process_json(file_list_path, destination_folder):
-    """Copy files from the JSON list to the destination folder while ensuring space and avoiding duplicates."""
-    remove_existing_files(file_list_path)
+def process_json(file_list_path, destination_folder, workers_per_device=copy_scheduler.WORKERS_PER_DEVICE,
+                 max_workers=copy_scheduler.MAX_WORKERS, max_bandwidth=copy_scheduler.MAX_BANDWIDTH,
+                 packing_mode=space_packing.DEFAULT_PACKING_MODE):
+    """Copy files from the JSON list to the destination folder while ensuring space and avoiding duplicates.
 
-    try:
-        with open(file_list_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-    except (json.JSONDecodeError, FileNotFoundError) as e:
-        logging.error(f"Error loading JSON file: {e}")
+    Transfers run concurrently, grouped by source drive; the work list is only updated from this thread.
+    """
+    journal = load_journal(file_list_path)
+    if journal is None:
         return
 
-    files_to_copy = data.get("files", [])
-    
-    if not isinstance(files_to_copy, list):
-        logging.error("Invalid format: 'files' should be a list.")
-        return
+    folder_index.clear()  # Destinations may have changed since the last call
+    remove_existing_files(journal)
+    files_to_copy = journal.files
 
     if not files_to_copy:
         print("No files to process.")
+        journal.close()
         return
 
     files_to_copy = [f for f in files_to_copy if "file" in f and "size" in f]
@@ -146,26 +282,19 @@ def process_json(file_list_path, destination_folder):
     non_mp4_files.sort(key=lambda x: x['size'])
     mp4_files.sort(key=lambda x: x['size'])
 
-    # Combine the lists with non-MP4 files first
-    files_to_copy = non_mp4_files + mp4_files
-
     free_space = get_free_space(destination_folder)
     if free_space == 0:
         print("Unable to determine free space or insufficient permissions.")
+        journal.close()
         return
 
-    total_space_needed = 0
-    eligible_files = []
-    for file_entry in files_to_copy:
-        file_size = file_entry['size']
-        if total_space_needed + file_size + EXTRA_SPACE_REQUIRED <= free_space:
-            eligible_files.append(file_entry)
-            total_space_needed += file_size
-        else:
-            break
+    # Pack non-MP4 files first, then MP4 files into whatever space is left
+    eligible_files = space_packing.select_by_priority([non_mp4_files, mp4_files], free_space - EXTRA_SPACE_REQUIRED, packing_mode)
+    total_space_needed = sum(file_entry['size'] for file_entry in eligible_files)
 
     if not eligible_files:
         print(f"Not enough space to copy any files. Free space: {free_space / (1024**3):.2f} GB")
+        journal.close()
         return
 
     print(f"Free space: {free_space / (1024**3):.2f} GB")
@@ -182,80 +311,82 @@ def process_json(file_list_path, destination_folder):
     os.makedirs(kids_folder, exist_ok=True)
 
     processed_count = 0
-    remaining_files = list(files_to_copy)
+    tasks = []
+    planned_destinations = set()
+
+    for file_entry in eligible_files:
+        file_path = file_entry["file"]
+        file_name = os.path.basename(file_path)
+        file_size = file_entry["size"]
 
-    current_file_path = None  # To store the current file being processed
-    current_file_entry = None  # To store the current file entry in the list
+        if not os.path.exists(file_path):
+            print(f"\nSkipping (not found): {file_path}")
+            journal.remove(file_path)  # Journal the removal immediately
+            continue
+
+        if is_non_english_audio:
+            dest_path = os.path.join(destination_folder, file_name)
+        else:
+            if "2160" in file_name:
+                dest_path = os.path.join(twenty_folder, file_name)
+            else:
+                dest_path = os.path.join(retag_folder if file_size < RETAG_THRESHOLD else destination_folder, file_name)
+
+        # Check if the file already exists in the destination or kids folder
+        kids_dest_path = os.path.join(kids_folder, file_name)
+        resuming = has_resume_point(dest_path)
+        existing = existing_copy_state(file_entry, dest_path, journal.hashes.get(file_path)) if destination_exists(dest_path) else None
+        if destination_exists(kids_dest_path) or existing == "copied":
+            print(f"\nAlready exists (treating as copied): {file_name}")
+            if resuming:
+                delete_partial_file(dest_path)  # A stale partial of a file that is already there
+            journal.remove(file_path)
+            processed_count += 1
+            continue
+        if dest_path in planned_destinations:
+            print(f"\nSkipping duplicate name this run: {file_path}")
+            continue
+        planned_destinations.add(dest_path)
+        if existing == "recopy":
+            print(f"\nExisting copy doesn't match its recorded size, copying again: {file_name}")
+            trash_file(dest_path, "mismatched copy")
+        if resuming and existing != "hash":
+            print(f"\nResuming interrupted copy: {file_name}")
+
+        # Non-English audio files and non-MP4 files are moved, MP4 files are copied
+        move = is_non_english_audio or not file_name.lower().endswith('.mp4')
+        tasks.append({"entry": file_entry, "src": file_path, "dst": dest_path, "size": file_size, "move": move,
+                      "check_hash": journal.hashes.get(file_path) if existing == "hash" else None})
+
+    def on_result(task, error, started):
+        nonlocal processed_count
+        if task.get("hash"):
+            journal.record_hash(task["src"], task["hash"])  # Lets a later run verify an existing copy without re-copying
+        if error is None:
+            # If copy or move was successful, remove the file from the work list
+            journal.remove(task["src"])
+            processed_count += 1
+        elif started:
+            if not isinstance(error, copy_scheduler.TransferCancelled):
+                logging.error(f"Error processing {os.path.basename(task['src'])}: {error}")
+            if not isinstance(error, copy_engine.VerificationError) and os.path.exists(copy_engine.resume_sidecar_path(partial_path(task["dst"]))):
+                print(f"\nKeeping partial copy to resume next run: {partial_path(task['dst'])}")
+            else:
+                delete_partial_file(task["dst"])  # Delete the partial file at the destination
 
     try:
-        with tqdm(total=len(eligible_files), desc="Processing files", unit="file") as pbar:
-            for file_entry in eligible_files[:]:
-                file_path = file_entry["file"]
-                file_name = os.path.basename(file_path)
-                file_size = file_entry["size"]
-
-                if not os.path.exists(file_path):
-                    print(f"\nSkipping (not found): {file_path}")
-                    remaining_files.remove(file_entry)  # Remove from processing list
-                    data["files"] = remaining_files  # Update JSON data
-                    save_json(file_list_path, data)  # Save changes immediately
-                    continue
-
-                if is_non_english_audio:
-                    dest_path = os.path.join(destination_folder, file_name)
-                else:
-                    if "2160" in file_name:
-                        dest_path = os.path.join(twenty_folder, file_name)
-                    else:
-                        dest_path = os.path.join(retag_folder if file_size < RETAG_THRESHOLD else destination_folder, file_name)
-
-                # Check if the file already exists in the destination or kids folder
-                kids_dest_path = os.path.join(kids_folder, file_name)
-                if os.path.exists(dest_path) or os.path.exists(kids_dest_path):
-                    print(f"\nAlready exists (treating as copied): {file_name}")
-                    remaining_files.remove(file_entry)
-                    processed_count += 1
-                else:
-                    try:
-                        if is_non_english_audio:
-                            print(f"\nMoving: {file_name} → {dest_path}")
-                            current_file_path = dest_path  # Store the current destination path of the file being moved
-                            move_file_with_progress(file_path, dest_path)  # Move the file with progress bar
-                        else:
-                            if file_name.lower().endswith('.mp4'):
-                                print(f"\nCopying: {file_name} → {dest_path}")
-                                current_file_path = dest_path  # Store the current destination path of the file being copied
-                                copy_file_with_progress(file_path, dest_path)  # Copy the file with progress bar
-                            else:
-                                print(f"\nMoving: {file_name} → {dest_path}")
-                                current_file_path = dest_path  # Store the current destination path of the file being moved
-                                move_file_with_progress(file_path, dest_path)  # Move non-MP4 files directly
-
-                        # If copy or move was successful, remove the file from the remaining list
-                        remaining_files.remove(file_entry)
-                        processed_count += 1
-
-                    except Exception as e:
-                        logging.error(f"Error processing {file_name}: {e}")
-                        delete_partial_file(current_file_path)  # Delete the partial file at the current destination
-                        continue
-
-                pbar.update(1)
-                data["files"] = remaining_files
-                save_json(file_list_path, data)
+        copy_scheduler.run_transfers(tasks, transfer_file, on_result, workers_per_device, max_workers, max_bandwidth)
     except KeyboardInterrupt:
         print("\nProcess interrupted. Saving progress...")
-        # Clean up: delete the partially processed file if it was being processed
-        if current_file_path and os.path.exists(current_file_path):
-            print(f"Deleting partially processed file: {current_file_path}")
-            os.remove(current_file_path)
+        journal.close()
         logging.shutdown()
         if os.path.exists(LOG_FILE) and os.path.getsize(LOG_FILE) == 0:
             os.remove(LOG_FILE)
             print("Deleted empty process_errors.log file")
         sys.exit(0)
-    data["files"] = remaining_files
-    save_json(file_list_path, data)
+    journal.close()
+    print_index_stats()
+    print(f"Processed {processed_count} of {len(eligible_files)} files.")
     print("File processing complete.")
 
 def get_paths():
@@ -277,8 +408,21 @@ def get_paths():
     return file_list, destination_folder
 
 if __name__ == "__main__":
-    file_list, destination = get_paths()
-    if not os.path.isdir(destination):
-        print("Invalid destination folder.")
+    parser = argparse.ArgumentParser(description="Copy or move the files in a work list to a destination folder.")
+    parser.add_argument("--workers-per-device", type=int, default=copy_scheduler.WORKERS_PER_DEVICE, help="concurrent transfers per source drive")
+    parser.add_argument("--max-workers", type=int, default=copy_scheduler.MAX_WORKERS, help="concurrent transfers overall")
+    parser.add_argument("--max-bandwidth", type=float, default=copy_scheduler.MAX_BANDWIDTH, help="overall MB/s cap, 0 for none")
+    parser.add_argument("--packing", choices=space_packing.PACKING_MODES, default=space_packing.DEFAULT_PACKING_MODE,
+                        help="prefix: stop at the first file that doesn't fit; count: most files; bytes: fill the most space, favouring the largest files")
+    parser.add_argument("--benchmark", metavar="FOLDER", help="measure throughput with 1, 2 and 4 workers in FOLDER and exit")
+    args = parser.parse_args()
+
+    if args.benchmark:
+        copy_scheduler.benchmark(args.benchmark)
     else:
-        process_json(file_list, destination)
\ No newline at end of file
+        file_list, destination = get_paths()
+        if not os.path.isdir(destination):
+            print("Invalid destination folder.")
+        else:
+            process_json(file_list, destination, args.workers_per_device, args.max_workers, args.max_bandwidth * 1024 * 1024,
+                         args.packing)
\ No newline at end of file
@@ -1,7 +1,7 @@
 import os
 import json
-import subprocess
 from tqdm import tqdm
+import probe_cache  # Shared on-disk ffprobe result cache
 
 LOG_FILE = "non_english_audio.json"
 SUPPORTED_EXTENSIONS = (".mp4", ".mkv", ".avi", ".mov", ".flv", ".wmv", ".webm", ".mpg")
@@ -27,30 +27,15 @@ def save_log(log_data):
         print(f"Error saving log file: {e}")
 
 def get_audio_languages(file_path):
-    """Runs ffprobe to get the language of audio tracks in a media file."""
-    cmd = [
-        "ffprobe",
-        "-v", "quiet",
-        "-print_format", "json",
-        "-show_streams",
-        "-select_streams", "a",
-        file_path
-    ]
-    
-    try:
-        result = subprocess.run(cmd, capture_output=True, text=True, check=True)
-        streams = json.loads(result.stdout).get("streams", [])
-
-        languages = {stream.get("tags", {}).get("language", "und") for stream in streams}
-
-        return languages
-    except subprocess.CalledProcessError as e:
-        tqdm.write(f"\nError processing {file_path}: {e}")
-        return set()
-    except json.JSONDecodeError:
-        tqdm.write(f"\nInvalid JSON output from ffprobe for {file_path}")
+    """Gets the language of audio tracks in a media file from the cached ffprobe result."""
+    info = probe_cache.probe_file(file_path)
+    if info is None:
+        tqdm.write(f"\nError processing {file_path}: ffprobe could not read the file")
         return set()
 
+    streams = probe_cache.get_streams(info, "audio")
+    return {stream.get("tags", {}).get("language", "und") for stream in streams}
+
 def delete_file(file_path):
     """Deletes the specified file."""
     try:
@@ -100,6 +85,8 @@ def scan_directory(root_folder):
     except Exception as e:
         print(f"\nUnexpected error: {e}")
 
+    probe_cache.print_stats()
+
 if __name__ == "__main__":
     folder = input("Enter the folder to scan: ").strip()
     if os.path.isdir(folder):
@@ -0,0 +1,129 @@
+import time
+import random
+import argparse
+
+# Configurable settings
+PACKING_MODES = ("prefix", "count", "bytes")
+DEFAULT_PACKING_MODE = "count"  # "bytes" gains little space and trades many small files for a few huge ones
+DP_UNIT = 1024 * 1024  # Subset-sum granularity; sizes are rounded up so a solution always really fits
+CORE_SIZE = 64  # Files re-solved exactly after the largest-first fill
+
+def select_prefix(files, capacity):
+    """The original behaviour: take files in order and stop at the first one that doesn't fit."""
+    selected = []
+    used = 0
+    for file_entry in files:
+        if used + file_entry["size"] > capacity:
+            break
+        selected.append(file_entry)
+        used += file_entry["size"]
+    return selected
+
+def select_max_count(files, capacity):
+    """Maximise the number of files: smallest first, skipping (not stopping at) files that don't fit."""
+    selected = []
+    used = 0
+    for file_entry in sorted(files, key=lambda f: f["size"]):
+        if used + file_entry["size"] > capacity:
+            break  # Everything after this is at least as large
+        selected.append(file_entry)
+        used += file_entry["size"]
+    return selected
+
+def subset_sum(sizes, capacity, unit=DP_UNIT):
+    """Exact subset sum on sizes rounded up to unit, using big-int bitsets. Returns the chosen indexes."""
+    capacity_units = capacity // unit
+    weights = [-(-size // unit) for size in sizes]
+    mask = (1 << (capacity_units + 1)) - 1
+    reachable = [1]  # reachable[i] = sums reachable with the first i items, bit k set if k units is reachable
+    for weight in weights:
+        reachable.append((reachable[-1] | (reachable[-1] << weight)) & mask)
+
+    target = reachable[-1].bit_length() - 1
+    chosen = []
+    for i in range(len(weights) - 1, -1, -1):
+        if not (reachable[i] >> target) & 1:
+            chosen.append(i)  # target is only reachable by using item i
+            target -= weights[i]
+    return chosen
+
+def select_max_bytes(files, capacity, core_size=CORE_SIZE):
+    """Fill as many bytes as possible: largest-first fill, then an exact re-solve of the boundary files.
+
+    The largest-first fill leaves less free space than the smallest file it skipped. The smallest
+    selected files and the largest skipped files that could still matter are then re-packed exactly
+    into the space they share, which closes most of the remaining gap in well under a second even
+    for 100k candidates.
+    """
+    by_size = sorted(files, key=lambda f: f["size"], reverse=True)
+    selected = []
+    skipped = []
+    remaining = capacity
+    for file_entry in by_size:
+        if file_entry["size"] <= remaining:
+            selected.append(file_entry)
+            remaining -= file_entry["size"]
+        else:
+            skipped.append(file_entry)
+
+    if not skipped or not selected:
+        return selected
+
+    core_selected = selected[-(core_size // 2):]  # Smallest selected files
+    core_capacity = remaining + sum(f["size"] for f in core_selected)
+    core_skipped = [f for f in skipped if f["size"] <= core_capacity][:core_size - len(core_selected)]
+    core = core_selected + core_skipped
+
+    chosen = [core[i] for i in subset_sum([f["size"] for f in core], core_capacity)]
+    if sum(f["size"] for f in chosen) > sum(f["size"] for f in core_selected):
+        selected = selected[:len(selected) - len(core_selected)] + chosen
+    return selected
+
+def select_files(files, capacity, mode=DEFAULT_PACKING_MODE):
+    """Pick which of files to transfer into capacity bytes, keeping them in their original order."""
+    if capacity <= 0:
+        return []
+    if mode == "prefix":
+        return select_prefix(files, capacity)
+    if mode == "count":
+        chosen = select_max_count(files, capacity)
+    elif mode == "bytes":
+        chosen = select_max_bytes(files, capacity)
+    else:
+        raise ValueError(f"Unknown packing mode: {mode}")
+    chosen_ids = {id(f) for f in chosen}
+    return [f for f in files if id(f) in chosen_ids]
+
+def select_by_priority(groups, capacity, mode=DEFAULT_PACKING_MODE):
+    """Pack each priority group in turn into whatever space the earlier groups left over.
+
+    With the prefix mode the groups are treated as one list, exactly like the original loop.
+    """
+    if mode == "prefix":
+        return select_prefix([f for group in groups for f in group], capacity)
+    selected = []
+    for group in groups:
+        chosen = select_files(group, capacity, mode)
+        capacity -= sum(f["size"] for f in chosen)
+        selected.extend(chosen)
+    return selected
+
+def benchmark(count=100_000, capacity=4 * 1024 ** 4, seed=1):
+    """Time each packing mode on synthetic video sizes and show how full each one gets the disk."""
+    rng = random.Random(seed)
+    files = [{"file": f"file_{i}.mkv", "size": int(rng.lognormvariate(21.5, 1.0))} for i in range(count)]
+    print(f"{count} candidates, {sum(f['size'] for f in files) / 1024 ** 4:.1f} TB total, {capacity / 1024 ** 4:.1f} TB free")
+    print(f"{'mode':>8} {'seconds':>9} {'files':>8} {'used GB':>10} {'left MB':>10}")
+    for mode in PACKING_MODES:
+        start = time.perf_counter()
+        chosen = select_files(sorted(files, key=lambda f: f["size"]), capacity, mode)
+        elapsed = time.perf_counter() - start
+        used = sum(f["size"] for f in chosen)
+        print(f"{mode:>8} {elapsed:>9.3f} {len(chosen):>8} {used / 1024 ** 3:>10.1f} {(capacity - used) / 1024 ** 2:>10.1f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the destination space packing modes.")
+    parser.add_argument("--count", type=int, default=100_000, help="number of synthetic candidate files")
+    parser.add_argument("--free-tb", type=float, default=4.0, help="free space to pack into, in TB")
+    args = parser.parse_args()
+    benchmark(args.count, int(args.free_tb * 1024 ** 4))
@@ -0,0 +1,34 @@
+import sqlite3
+import threading
+import atexit
+
+class Database:
+    """A SQLite file shared by every thread of the process, opened on first use.
+
+    schema is a list of CREATE ... IF NOT EXISTS statements run when the file is opened. Hold lock
+    around connect() and everything done with the connection it returns. Whatever is uncommitted
+    is committed when the database is closed, which happens at exit at the latest.
+    """
+
+    def __init__(self, path, schema):
+        self.path = path
+        self.schema = schema
+        self.lock = threading.RLock()  # Reentrant so a caller holding it can still close()
+        self._connection = None
+
+    def connect(self):
+        if self._connection is None:
+            self._connection = sqlite3.connect(self.path, check_same_thread=False)
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("PRAGMA synchronous=NORMAL")
+            for statement in self.schema:
+                self._connection.execute(statement)
+            atexit.register(self.close)
+        return self._connection
+
+    def close(self):
+        with self.lock:
+            if self._connection is not None:
+                self._connection.commit()
+                self._connection.close()
+                self._connection = None
@@ -0,0 +1,157 @@
+import os
+import json
+
+# Configurable settings
+JOURNAL_SUFFIX = ".journal"  # Journal lives next to the work list, e.g. files_to_process.json.journal
+COMPACT_EVERY = 500  # Minimum journal records before folding them into the JSON checkpoint
+DEFAULT_HEADER = {"encoder": "", "ignored_encoders": []}
+
+class WorkJournal:
+    """A files_to_process-style work list stored as a JSON checkpoint plus an append-only JSON Lines journal.
+
+    Every change is appended to the journal as one small record instead of rewriting the whole list.
+    Records are idempotent (add replaces, remove ignores missing entries), so replaying a journal over
+    a checkpoint that already contains some of its records is safe. The checkpoint keeps the original
+    {"encoder": ..., "ignored_encoders": [...], "files": [...]} layout and is replaced atomically.
+    """
+
+    def __init__(self, json_path, compact_every=COMPACT_EVERY):
+        self.json_path = json_path
+        self.journal_path = json_path + JOURNAL_SUFFIX
+        self.compact_every = compact_every
+        self.header = dict(DEFAULT_HEADER)
+        self.entries = {}  # file path -> entry, in list order
+        self.hashes = {}  # file path -> content hash of a verified copy, kept after the entry is removed
+        self._journal_file = None
+        self._journal_records = 0
+
+    def load(self):
+        """Load the checkpoint and replay the journal. Raises ValueError if the checkpoint is corrupt."""
+        self.header = dict(DEFAULT_HEADER)
+        self.entries = {}
+        self.hashes = {}
+        self._journal_records = 0
+
+        if os.path.exists(self.json_path):
+            with open(self.json_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if not isinstance(data.get("files", []), list):
+                raise ValueError("Invalid format: 'files' should be a list.")
+            self.header.update({key: value for key, value in data.items() if key not in ("files", "hashes")})
+            self.hashes = data.get("hashes", {})
+            for entry in data.get("files", []):
+                if "file" in entry:
+                    self.entries[entry["file"]] = entry
+
+        if os.path.exists(self.journal_path):
+            torn = False
+            with open(self.journal_path, "r", encoding="utf-8") as f:
+                for line_number, line in enumerate(f, 1):
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        print(f"Ignoring truncated journal record at {self.journal_path}:{line_number}")
+                        torn = True
+                        break  # Only the last record can be partial after a crash
+                    self._apply(record)
+                    self._journal_records += 1
+                    torn = not line.endswith("\n")
+            if torn:
+                # New records would be appended to the broken line and lost on the next replay,
+                # so fold what was read into the checkpoint and start a clean journal
+                self.checkpoint()
+        return self
+
+    @property
+    def files(self):
+        """Snapshot of the current entries as a list."""
+        return list(self.entries.values())
+
+    def __contains__(self, file_path):
+        return file_path in self.entries
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, file_path):
+        return self.entries.get(file_path)
+
+    def _apply(self, record):
+        op = record["op"]
+        if op == "add":
+            self.entries[record["entry"]["file"]] = record["entry"]
+        elif op == "remove":
+            self.entries.pop(record["file"], None)
+        elif op == "update":
+            if record["file"] in self.entries:
+                self.entries[record["file"]].update(record["fields"])
+        elif op == "set":
+            self.header[record["key"]] = record["value"]
+        elif op == "hash":
+            self.hashes[record["file"]] = record["hash"]
+
+    def _append(self, record):
+        """Apply a record in memory and append it to the journal, compacting when it gets long."""
+        self._apply(record)
+        if self._journal_file is None:
+            self._journal_file = open(self.journal_path, "a", encoding="utf-8")
+        self._journal_file.write(json.dumps(record) + "\n")
+        self._journal_file.flush()
+        self._journal_records += 1
+        # Compacting only once the journal is as long as the list keeps total bytes written linear
+        if self._journal_records >= max(self.compact_every, len(self.entries) + len(self.hashes)):
+            self.checkpoint()
+
+    def add(self, entry):
+        """Add an entry, replacing any existing entry for the same file."""
+        self._append({"op": "add", "entry": entry})
+
+    def remove(self, file_path):
+        """Remove the entry for a file if it is present."""
+        if file_path in self.entries:
+            self._append({"op": "remove", "file": file_path})
+
+    def update(self, file_path, **fields):
+        """Record new values for some fields of an existing entry."""
+        if file_path in self.entries:
+            self._append({"op": "update", "file": file_path, "fields": fields})
+
+    def set(self, key, value):
+        """Set a top-level field such as 'encoder'."""
+        if self.header.get(key) != value:
+            self._append({"op": "set", "key": key, "value": value})
+
+    def record_hash(self, file_path, content_hash):
+        """Remember the hash of a verified copy of file_path, even after its entry is removed."""
+        if self.hashes.get(file_path) != content_hash:
+            self._append({"op": "hash", "file": file_path, "hash": content_hash})
+
+    def to_data(self):
+        data = {**self.header, "files": self.files}
+        if self.hashes:
+            data["hashes"] = self.hashes
+        return data
+
+    def checkpoint(self):
+        """Write the full list to a temp file, fsync, swap it in and start a new empty journal."""
+        temp_path = self.json_path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(self.to_data(), f, indent=4)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, self.json_path)
+
+        if self._journal_file is not None:
+            self._journal_file.close()
+            self._journal_file = None
+        if os.path.exists(self.journal_path):
+            os.remove(self.journal_path)
+        self._journal_records = 0
+
+    def close(self):
+        """Checkpoint if anything is pending and release the journal file."""
+        if self._journal_records or not os.path.exists(self.json_path):
+            self.checkpoint()
+        elif self._journal_file is not None:
+            self._journal_file.close()
+            self._journal_file = None